@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+archival.py
+
+Cost and effect of moving closed loans out of the hot tables. Seeds loans
+with --payments-per-loan payments each, pays off --closed-share of them
+and backdates their closing past the archive cutoff, then:
+
+  - times one payment-history lookup per sampled closed loan in the hot
+    payments table, before archiving
+  - runs the archive job and reports loans and payments moved per second
+  - reports rows left in the hot tables against rows and bytes archived
+  - times the same lookups through ArchiveReader (loan, payments, ledger)
+
+  python benchmarks/archival.py --loans 20000 --payments-per-loan 12 --save baseline-archival.json
+  python benchmarks/archival.py --loans 20000 --payments-per-loan 12 --baseline baseline-archival.json
+
+Uses a throwaway SQLite database and archive directory unless DATABASE_URL
+is set (point it at a disposable database: rows are added and deleted).
+Listing-cache invalidation goes to REDIS_URL and is best effort, so no
+Redis is needed.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from baseline import HIGHER_IS_BETTER, LOWER_IS_BETTER, compare, metric, save_results  # noqa: E402
+
+SEED_BATCH = 1000
+
+
+def application(rng: random.Random, index: int) -> Dict:
+    return {
+        "application_id": f"ARCHIVE-{uuid.UUID(int=rng.getrandbits(128))}",
+        "user_id": f"archive-{index % 500}@buffr.ai",
+        "company_id": f"archive-company-{rng.randrange(50)}",
+        "employee_verification_id": "archive-verification",
+        "loan_amount": rng.choice((2000, 5000, 8000, 12000)),
+        "loan_term": rng.choice((3, 6, 12)),
+        "monthly_income": 20000,
+    }
+
+
+async def seed(main, args, rng: random.Random) -> List[str]:
+    """Loans with their payments; returns the ids of the loans paid off"""
+    loan_ids: List[str] = []
+    for offset in range(0, args.loans, SEED_BATCH):
+        batch = [main.LoanApplicationRequest(**application(rng, offset + index))
+                 for index in range(min(SEED_BATCH, args.loans - offset))]
+        async with main.AsyncSessionLocal() as db:
+            result = await main.LoanService(db).create_loan_applications_bulk(batch)
+        loan_ids.extend(row["loan_id"] for row in result["data"]["results"])
+
+    closed = rng.sample(loan_ids, int(len(loan_ids) * args.closed_share))
+    # Instalments spread over the months before today, then a payoff for the closed loans
+    payments = [
+        {"loan_id": loan_id, "amount": 50, "payment_date": (datetime.utcnow() - timedelta(days=30 * month)).isoformat()}
+        for loan_id in loan_ids for month in range(args.payments_per_loan - 1, 0, -1)
+    ]
+    payments += [{"loan_id": loan_id, "amount": 10 ** 7, "payment_date": datetime.utcnow().isoformat()}
+                 for loan_id in closed]
+    for offset in range(0, len(payments), main.INGEST_CHUNK_SIZE):
+        chunk = [(offset + index, record, None)
+                 for index, record in enumerate(payments[offset:offset + main.INGEST_CHUNK_SIZE])]
+        async with main.AsyncSessionLocal() as db:
+            await main.PaymentService(db).apply_payment_chunk(chunk)
+    return closed
+
+
+def time_lookups(lookup: Callable[[str], int], loan_ids: List[str]) -> Tuple[float, float, int]:
+    """p50 and p95 milliseconds per lookup, and the rows found"""
+    samples, found = [], 0
+    for loan_id in loan_ids:
+        started = time.perf_counter()
+        found += lookup(loan_id)
+        samples.append(time.perf_counter() - started)
+    if len(samples) < 2:
+        return samples[0] * 1000, samples[0] * 1000, found
+    quantiles = statistics.quantiles(samples, n=100)
+    return quantiles[49] * 1000, quantiles[94] * 1000, found
+
+
+def main(args) -> int:
+    from sqlalchemy import select, update
+
+    import archive
+    import main as api
+    import migrate
+
+    migrate.upgrade()
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    closed = asyncio.run(seed(api, args, rng))
+    asyncio.run(api.database.dispose_engines())
+    print(f"seeded {args.loans} loans ({len(closed)} closed) in {time.perf_counter() - started:.1f}s")
+
+    with api.database.SessionLocal() as db:
+        db.execute(update(api.Loan).where(api.Loan.status == "completed")
+                   .values(updated_at=datetime.utcnow() - timedelta(days=args.older_than_days + 1)))
+        db.commit()
+    sample = rng.sample(closed, min(args.lookups, len(closed)))
+
+    def hot_lookup(loan_id: str) -> int:
+        with api.database.SessionLocal() as db:
+            return len(db.execute(select(api.Payment).where(api.Payment.loan_id == loan_id)
+                                  .order_by(api.Payment.payment_date)).all())
+
+    hot_p50, hot_p95, _ = time_lookups(hot_lookup, sample)
+    before = archive.status(args.directory)["hot"]
+
+    outcome = archive.run(args.older_than_days, args.chunk_size, args.directory)
+    after = archive.status(args.directory)
+    reader = archive.ArchiveReader(args.directory)
+    archived_p50, archived_p95, found = time_lookups(
+        lambda loan_id: int(reader.loan(loan_id) is not None) + sum(1 for _ in reader.history(loan_id)), sample,
+    )
+    if found < len(sample):
+        raise RuntimeError(f"only {found} archived rows found for {len(sample)} sampled loans")
+
+    seconds = outcome["elapsed_seconds"]
+    archived_bytes = sum(table["bytes"] for table in after["archived"].values())
+    print(f"\narchived {outcome['loans']} loans, {outcome['payments']} payments, "
+          f"{outcome['ledger_entries']} ledger entries in {seconds:.2f}s "
+          f"({outcome['loans'] / seconds:.0f} loans/s, {outcome['payments'] / seconds:.0f} payments/s)")
+    print(f"{'hot table':<18} {'before':>9} {'after':>9}")
+    for table in ("loans", "loan_applications", "payments", "ledger_entries"):
+        print(f"{table:<18} {before[table]:>9} {after['hot'][table]:>9}")
+    print(f"archive: {archived_bytes / 1024:.0f} KiB in "
+          f"{sum(table['files'] for table in after['archived'].values())} files")
+    print(f"\n{'lookup':<10} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'hot':<10} {hot_p50:>8.2f} {hot_p95:>8.2f}")
+    print(f"{'archived':<10} {archived_p50:>8.2f} {archived_p95:>8.2f}")
+
+    results = {
+        "archive.loans_per_second": metric(outcome["loans"] / seconds, HIGHER_IS_BETTER),
+        "archive.payments_per_second": metric(outcome["payments"] / seconds, HIGHER_IS_BETTER),
+        "archive.bytes_per_payment": metric(archived_bytes / max(outcome["payments"], 1), LOWER_IS_BETTER),
+        "hot.payment_rows_after": metric(after["hot"]["payments"], LOWER_IS_BETTER),
+        "hot_lookup.p50_ms": metric(hot_p50, LOWER_IS_BETTER),
+        "archived_lookup.p50_ms": metric(archived_p50, LOWER_IS_BETTER),
+        "archived_lookup.p95_ms": metric(archived_p95, LOWER_IS_BETTER),
+    }
+    config = {key: getattr(args, key) for key in ("loans", "payments_per_loan", "closed_share", "chunk_size", "seed")}
+    config["database"] = os.environ["DATABASE_URL"].split(":", 1)[0]
+    if args.save:
+        save_results(args.save, "archival", config, results)
+    if args.baseline and not compare(args.baseline, "archival", config, results, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Closed-loan archival throughput and archived lookup latency")
+    parser.add_argument("--loans", type=int, default=5000)
+    parser.add_argument("--payments-per-loan", type=int, default=12)
+    parser.add_argument("--closed-share", type=float, default=0.6, help="fraction of loans paid off")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="loans per archived chunk")
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--lookups", type=int, default=200, help="closed loans looked up before and after")
+    parser.add_argument("--directory", help="archive directory (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    args.directory = args.directory or os.path.join(tempfile.mkdtemp(), "archive")
+    os.environ.setdefault("SESSION_SIGNING_KEYS", "bench:" + "k" * 32)
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'archival.sqlite')}"
+    import logging
+    # Without a local Redis every chunk's best-effort cache invalidation logs a connection error
+    logging.disable(logging.ERROR)
+    sys.exit(main(args))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+auth_overhead.py
+
+Micro-benchmark of per-request authentication cost: the Redis
+``GET session:{token}`` lookup that get_current_user used to do, against
+in-process verification of a signed token plus the deny-list check.
+
+  REDIS_URL=redis://localhost:6379 python benchmarks/auth_overhead.py --iterations 20000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import redis.asyncio as redis  # noqa: E402
+
+from session_tokens import RevocationList, TokenSigner, parse_signing_keys  # noqa: E402
+
+
+def report(label: str, samples) -> None:
+    samples = sorted(samples)
+    quantiles = statistics.quantiles(samples, n=100)
+    print(f"{label:<28} mean {statistics.fmean(samples) * 1e6:8.1f} us   "
+          f"p50 {quantiles[49] * 1e6:8.1f} us   p99 {quantiles[98] * 1e6:8.1f} us")
+
+
+async def bench_redis_lookup(redis_url: str, iterations: int):
+    redis_conn = redis.from_url(redis_url)
+    token = str(uuid.uuid4())
+    await redis_conn.setex(f"session:{token}", 60, "bench@buffr.ai")
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await redis_conn.get(f"session:{token}")
+        samples.append(time.perf_counter() - started)
+
+    await redis_conn.delete(f"session:{token}")
+    await redis_conn.aclose()
+    return samples
+
+
+def bench_signed_verify(iterations: int):
+    signer = TokenSigner(parse_signing_keys("bench:" + "k" * 32))
+    revocations = RevocationList()
+    revocations.revoked = {uuid.uuid4().hex for _ in range(1000)}
+    token = signer.issue("bench@buffr.ai", 60)["token"]
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        claims = signer.verify(token)
+        revocations.is_revoked(claims["jti"])
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def main(args):
+    print(f"{args.iterations} iterations")
+    try:
+        report("redis GET session (before)", await bench_redis_lookup(args.redis_url, args.iterations))
+    except (OSError, redis.RedisError) as e:
+        print(f"redis GET session (before)   skipped: {e}")
+    report("signed token verify (after)", bench_signed_verify(args.iterations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Authentication overhead per request")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379"))
+    asyncio.run(main(parser.parse_args()))
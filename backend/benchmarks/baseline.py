@@ -0,0 +1,72 @@
+"""
+baseline.py
+
+Result files shared by the benchmark suite: each run can be saved as JSON
+and compared against a saved baseline, failing when any metric moved the
+wrong way by more than the tolerance.
+
+  python benchmarks/loadtest.py --save baseline-loadtest.json       # on main
+  python benchmarks/loadtest.py --baseline baseline-loadtest.json   # on a branch
+"""
+
+import json
+import platform
+import sys
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Direction of improvement per metric kind
+LOWER_IS_BETTER = "lower"
+HIGHER_IS_BETTER = "higher"
+
+
+def metric(value: float, better: str) -> Dict[str, Any]:
+    return {"value": value, "better": better}
+
+
+def save_results(path: str, benchmark: str, config: Dict[str, Any], metrics: Dict[str, Dict[str, Any]]) -> None:
+    with open(path, "w") as handle:
+        json.dump({
+            "benchmark": benchmark,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "machine": platform.platform(),
+            "config": config,
+            "metrics": metrics,
+        }, handle, indent=2)
+    print(f"results saved to {path}")
+
+
+def compare(path: str, benchmark: str, config: Dict[str, Any], metrics: Dict[str, Dict[str, Any]],
+            tolerance: float) -> bool:
+    """Print the change of every metric against the baseline at ``path``; False on any regression"""
+    with open(path) as handle:
+        baseline = json.load(handle)
+    if baseline.get("benchmark") != benchmark:
+        raise SystemExit(f"{path} holds {baseline.get('benchmark')} results, not {benchmark}")
+    if baseline.get("config") != config:
+        print(f"warning: baseline was recorded with a different configuration: {baseline.get('config')}")
+
+    regressions: List[str] = []
+    print(f"\n{'metric':<36} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, current in metrics.items():
+        previous = baseline["metrics"].get(name)
+        if previous is None:
+            print(f"{name:<36} {'-':>12} {current['value']:>12.3f}")
+            continue
+        if previous["value"]:
+            change = (current["value"] - previous["value"]) / previous["value"] * 100
+        else:
+            # Against a zero baseline (typically an error count) any move is infinitely large
+            change = 0.0 if not current["value"] else float("inf") * (1 if current["value"] > 0 else -1)
+        worse = change > tolerance if current["better"] == LOWER_IS_BETTER else change < -tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:<36} {previous['value']:>12.3f} {current['value']:>12.3f} {change:>+8.1f}%"
+              f"{'  REGRESSION' if worse else ''}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {tolerance}%: {', '.join(regressions)}")
+    else:
+        print(f"\nno regressions beyond {tolerance}%")
+    return not regressions
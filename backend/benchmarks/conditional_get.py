@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+conditional_get.py
+
+What polling clients cost on GET /api/loans, with and without conditional
+requests and compression. Each virtual client polls its listing every
+round; every --write-every rounds it makes a payment, which bumps its
+version. Three clients are compared over the same schedule:
+
+  full        no If-None-Match, Accept-Encoding: identity (the old behaviour)
+  etag        If-None-Match with the last ETag, identity
+  etag+gzip   If-None-Match, Accept-Encoding: gzip (what mobile clients send)
+
+and for each the response body bytes per poll, SQL statements per poll (the
+listing cache is flushed before every round, so an unchanged listing costs
+a query unless the ETag short-circuits it) and polls per second.
+
+Uses a throwaway SQLite database and fakeredis:
+
+  python benchmarks/conditional_get.py --users 20 --loans-per-user 50 --rounds 30
+  python benchmarks/conditional_get.py --save baseline-conditional.json
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from baseline import HIGHER_IS_BETTER, LOWER_IS_BETTER, compare, metric, save_results  # noqa: E402
+
+MODES = {
+    "full": (False, "identity"),
+    "etag": (True, "identity"),
+    "etag+gzip": (True, "gzip"),
+}
+
+
+async def seed(client, users: int, loans_per_user: int) -> Dict[str, Dict]:
+    """Log every user in and create their loans through the API; returns headers and a loan id per user"""
+    clients = {}
+    for index in range(users):
+        user_id = f"poll-{index}@buffr.ai"
+        login = await client.post("/api/auth/login", json={"email": user_id, "password": "bench"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        for number in range(loans_per_user):
+            created = await client.post("/api/loans", headers=headers, json={
+                "application_id": f"POLL-{index}-{number}",
+                "user_id": user_id,
+                "company_id": "poll-company",
+                "employee_verification_id": "poll-verification",
+                "loan_amount": 10_000_000,
+                "loan_term": 12,
+                "monthly_income": 12000,
+            })
+            created.raise_for_status()
+        clients[user_id] = {"headers": headers, "loan_id": created.json()["data"]["loan"]["id"]}
+    return clients
+
+
+async def run_mode(main, client, clients: Dict[str, Dict], mode: str, args, statements: List[int]) -> Dict[str, float]:
+    conditional, encoding = MODES[mode]
+    etags: Dict[str, str] = {}
+    polls = not_modified = wire_bytes = polling_statements = 0
+    elapsed = 0.0
+
+    for round_number in range(args.rounds):
+        if round_number and round_number % args.write_every == 0:
+            for user_id, state in clients.items():
+                paid = await client.post("/api/payments", headers=state["headers"], json={
+                    "loan_id": state["loan_id"],
+                    "user_id": user_id,
+                    "amount": 0.01,
+                    "payment_date": datetime.utcnow().isoformat(),
+                    "payment_method": "benchmark",
+                })
+                paid.raise_for_status()
+        # Cold listing cache every round, so an unchanged page still has to come from somewhere
+        await main.redis_client.eval(
+            "for _, key in ipairs(redis.call('KEYS', 'loans:pages:*')) do redis.call('DEL', key) end", 0
+        )
+
+        before = statements[0]
+        started = time.perf_counter()
+        for user_id, state in clients.items():
+            headers = {**state["headers"], "Accept-Encoding": encoding}
+            if conditional and user_id in etags:
+                headers["If-None-Match"] = etags[user_id]
+            response = await client.get(f"/api/loans?limit={args.limit}", headers=headers)
+            if response.status_code == 304:
+                not_modified += 1
+            elif response.status_code != 200:
+                raise RuntimeError(f"GET /api/loans returned {response.status_code}: {response.text[:200]}")
+            etags[user_id] = response.headers.get("etag", "")
+            wire_bytes += response.num_bytes_downloaded
+            polls += 1
+        elapsed += time.perf_counter() - started
+        # Only statements issued while polling count; the payments' own writes are excluded
+        polling_statements += statements[0] - before
+
+    return {
+        "polls_per_second": polls / elapsed,
+        "bytes_per_poll": wire_bytes / polls,
+        "statements_per_poll": polling_statements / polls,
+        "not_modified_ratio": not_modified / polls,
+    }
+
+
+async def run(args) -> int:
+    import fakeredis
+    import httpx
+    from sqlalchemy import event
+
+    import main
+    import migrate
+
+    migrate.upgrade()
+    main.redis_client = fakeredis.FakeAsyncRedis()
+    # SQL statements executed on the request path so far
+    statements = [0]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        clients = await seed(client, args.users, args.loans_per_user)
+        event.listen(
+            main.database.get_async_engine().sync_engine, "before_cursor_execute",
+            lambda *_: statements.__setitem__(0, statements[0] + 1),
+        )
+        results: Dict[str, Dict] = {}
+        print(f"{'mode':<10} {'polls/s':>9} {'bytes/poll':>11} {'SQL/poll':>9} {'304 share':>10}")
+        for mode in MODES:
+            outcome = await run_mode(main, client, clients, mode, args, statements)
+            print(f"{mode:<10} {outcome['polls_per_second']:>9.1f} {outcome['bytes_per_poll']:>11.0f} "
+                  f"{outcome['statements_per_poll']:>9.2f} {outcome['not_modified_ratio']:>10.2f}")
+            results[f"{mode}.polls_per_second"] = metric(outcome["polls_per_second"], HIGHER_IS_BETTER)
+            results[f"{mode}.bytes_per_poll"] = metric(outcome["bytes_per_poll"], LOWER_IS_BETTER)
+            results[f"{mode}.statements_per_poll"] = metric(outcome["statements_per_poll"], LOWER_IS_BETTER)
+    await main.database.dispose_engines()
+
+    config = {key: getattr(args, key) for key in ("users", "loans_per_user", "rounds", "write_every", "limit")}
+    if args.save:
+        save_results(args.save, "conditional_get", config, results)
+    if args.baseline and not compare(args.baseline, "conditional_get", config, results, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Polling cost of loan listings with ETags and gzip")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--loans-per-user", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=30, help="polls per user")
+    parser.add_argument("--write-every", type=int, default=10, help="rounds between each user's payments")
+    parser.add_argument("--limit", type=int, default=50, help="page size polled")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOGIN_RATE_LIMIT_PER_EMAIL", "0")
+    os.environ.setdefault("LOGIN_RATE_LIMIT_PER_ADDRESS", "0")
+    os.environ.setdefault("SESSION_SIGNING_KEYS", "bench:" + "k" * 32)
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'conditional.sqlite')}"
+    import logging
+    logging.disable(logging.INFO)
+    sys.exit(asyncio.run(run(args)))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+http_load.py
+
+Closed-loop HTTP load generator for the BuffrLend loan/payment endpoints.
+Each virtual client issues requests back to back for a fixed duration and
+the script reports requests/sec and latency percentiles per concurrency level.
+
+Run it against a live server, once on the old code and once on the new code,
+with the same database and worker settings:
+
+  uvicorn main:app --workers 1 --port 8000          # from backend/src
+  python benchmarks/http_load.py --base-url http://localhost:8000 \\
+      --concurrency 50 200 --duration 30 --scenario list
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    """Obtain a bearer token for the benchmark user."""
+    response = await client.post(
+        "/api/auth/login",
+        json={"email": "bench@buffr.ai", "password": "bench"},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def application_payload(user_id: str) -> dict:
+    return {
+        "application_id": f"BENCH-{uuid.uuid4()}",
+        "user_id": user_id,
+        "company_id": "bench-company",
+        "employee_verification_id": "bench-verification",
+        "loan_amount": 5000,
+        "loan_term": 6,
+        "monthly_income": 12000,
+        "monthly_expenses": 4000,
+    }
+
+
+async def seed_loan(client: httpx.AsyncClient, user_id: str) -> str:
+    """Create one loan to direct payment traffic at."""
+    response = await client.post("/api/loans", json=application_payload(user_id))
+    response.raise_for_status()
+    return response.json()["data"]["loan"]["id"]
+
+
+def build_request(scenario: str, user_id: str, loan_id: str):
+    if scenario == "list":
+        return "GET", "/api/loans", None
+    if scenario == "create":
+        return "POST", "/api/loans", application_payload(user_id)
+    return "POST", "/api/payments", {
+        "loan_id": loan_id,
+        "user_id": user_id,
+        "amount": 0.01,
+        "payment_date": datetime.utcnow().isoformat(),
+        "payment_method": "benchmark",
+    }
+
+
+async def run_level(base_url: str, token: str, scenario: str, concurrency: int,
+                    duration: float, user_id: str, loan_id: str) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                method, path, body = build_request(scenario, user_id, loan_id)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        token = await login(client)
+        client.headers["Authorization"] = f"Bearer {token}"
+        loan_id = await seed_loan(client, args.user_id) if args.scenario == "pay" else ""
+
+    print(f"scenario={args.scenario} duration={args.duration}s")
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for concurrency in args.concurrency:
+        result = await run_level(args.base_url, token, args.scenario, concurrency,
+                                 args.duration, args.user_id, loan_id)
+        print(f"{result['concurrency']:>8} {result['requests']:>9} {result['errors']:>7} "
+              f"{result['rps']:>9.1f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BuffrLend HTTP load generator")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=["list", "create", "pay"], default="list")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--user-id", default="bench@buffr.ai")
+    asyncio.run(main(parser.parse_args()))
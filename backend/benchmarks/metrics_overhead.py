@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+metrics_overhead.py
+
+Cost of leaving the /metrics instrumentation on. The same in-process request
+mix (health check, login, loan listing, payment) is driven through the ASGI
+app with METRICS_ENABLED=true and =false, in alternating child processes so
+each run imports a fresh app, and the median throughput of each side is
+compared. Also times the bare recording primitives.
+
+Uses a throwaway SQLite database and an in-memory fakeredis, so no services
+are needed:
+
+  python benchmarks/metrics_overhead.py --requests 3000 --rounds 5
+
+Exits non-zero if the overhead exceeds --max-overhead percent.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+USER = "bench@buffr.ai"
+
+
+async def drive(requests: int) -> float:
+    """Child process: seed a loan, then time ``requests`` requests of the mix; returns requests/sec"""
+    import fakeredis
+    import httpx
+
+    import main
+    import migrate
+
+    migrate.upgrade()
+    main.redis_client = fakeredis.FakeAsyncRedis()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/api/auth/login", json={"email": USER, "password": "bench"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        created = await client.post("/api/loans", headers=headers, json={
+            "application_id": f"BENCH-{uuid.uuid4()}",
+            "user_id": USER,
+            "company_id": "bench-company",
+            "employee_verification_id": "bench-verification",
+            "loan_amount": 1_000_000,
+            "loan_term": 12,
+            "monthly_income": 12000,
+        })
+        created.raise_for_status()
+        loan_id = created.json()["data"]["loan"]["id"]
+        payment = {
+            "loan_id": loan_id,
+            "user_id": USER,
+            "amount": 0.01,
+            "payment_date": datetime.utcnow().isoformat(),
+            "payment_method": "benchmark",
+        }
+
+        mix = [
+            ("GET", "/", None),
+            ("POST", "/api/auth/login", {"email": USER, "password": "bench"}),
+            ("GET", "/api/loans", None),
+            ("GET", "/api/loans", None),
+            ("POST", "/api/payments", payment),
+        ]
+        # Warm up connections, caches and code paths before timing
+        for method, path, body in mix * 20:
+            await client.request(method, path, headers=headers, json=body)
+
+        started = time.perf_counter()
+        for index in range(requests):
+            method, path, body = mix[index % len(mix)]
+            response = await client.request(method, path, headers=headers, json=body)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        elapsed = time.perf_counter() - started
+
+        if main.METRICS_ENABLED:
+            scrape = await client.get("/metrics")
+            assert b"http_request_duration_seconds_bucket" in scrape.content
+
+    await main.database.dispose_engines()
+    return requests / elapsed
+
+
+def run_child(enabled: bool, requests: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "METRICS_ENABLED": "true" if enabled else "false",
+            "LOGIN_RATE_LIMIT_PER_EMAIL": "0",
+            "LOGIN_RATE_LIMIT_PER_ADDRESS": "0",
+            "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'bench.sqlite')}",
+        }
+        env.setdefault("SESSION_SIGNING_KEYS", "bench:" + "k" * 32)
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(requests)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])["requests_per_second"]
+
+
+def bench_primitives(iterations: int = 200_000) -> None:
+    import metrics
+
+    histogram = metrics.Histogram("bench_seconds", "bench", ("route",))
+    counter = metrics.Counter("bench_total", "bench", ("source",))
+    for label, record in (
+        ("histogram.observe", lambda: histogram.observe(0.0042, "/api/loans")),
+        ("counter.inc", lambda: counter.inc(1, "api")),
+    ):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            record()
+        print(f"{label:<20} {(time.perf_counter() - started) / iterations * 1e9:8.0f} ns")
+
+
+def main(args) -> int:
+    if args.child:
+        import logging
+        logging.disable(logging.WARNING)
+        print(json.dumps({"requests_per_second": asyncio.run(drive(args.requests))}))
+        return 0
+
+    bench_primitives()
+    enabled, disabled = [], []
+    for round_number in range(args.rounds):
+        # Alternate which side goes first so drift on the machine hits both equally
+        for flag in ((True, False) if round_number % 2 == 0 else (False, True)):
+            (enabled if flag else disabled).append(run_child(flag, args.requests))
+        print(f"round {round_number + 1}: metrics on {enabled[-1]:8.0f} req/s   off {disabled[-1]:8.0f} req/s")
+
+    on, off = statistics.median(enabled), statistics.median(disabled)
+    overhead = (off - on) / off * 100
+    print(f"median: metrics on {on:.0f} req/s, off {off:.0f} req/s, overhead {overhead:+.2f}%")
+    if overhead > args.max_overhead:
+        print(f"FAIL: overhead above {args.max_overhead}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput cost of metrics instrumentation")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-overhead", type=float, default=3.0, help="allowed throughput loss in percent")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+pricing_bench.py
+
+Micro-benchmarks of loan pricing: LoanService's scalar pricing methods and
+build_loan_records (what every create request pays), and the vectorized
+pricing functions over arrays of --size loans (bulk intake, repricing and
+pre-qualification). Each case reports the median of --repeat timed runs.
+
+  python benchmarks/pricing_bench.py --save baseline-pricing.json
+  python benchmarks/pricing_bench.py --baseline baseline-pricing.json
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SESSION_SIGNING_KEYS", "bench:" + "k" * 32)
+
+import pricing  # noqa: E402
+from baseline import LOWER_IS_BETTER, compare, metric, save_results  # noqa: E402
+from main import LoanApplicationRequest, LoanService  # noqa: E402
+
+
+def time_per_call(function: Callable[[], object], calls: int, repeat: int) -> float:
+    """Median seconds per call over ``repeat`` runs of ``calls`` calls"""
+    function()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        runs.append((time.perf_counter() - started) / calls)
+    return statistics.median(runs)
+
+
+def main(args) -> int:
+    service = LoanService(None)
+    application = LoanApplicationRequest(
+        application_id="BENCH-1", user_id="bench@buffr.ai", company_id="bench-company",
+        employee_verification_id="bench-verification", loan_amount=12000, loan_term=12,
+        monthly_income=9000, monthly_expenses=3000,
+    )
+    rng = np.random.default_rng(args.seed)
+    amounts = rng.uniform(1000, 50000, args.size)
+    incomes = rng.uniform(2000, 30000, args.size)
+    expenses = incomes * rng.uniform(0.1, 0.6, args.size)
+    terms = rng.choice([3, 6, 12, 24], args.size)
+    rates = pricing.interest_rates(amounts, incomes)
+
+    scalar_cases = {
+        "calculate_interest_rate": lambda: service.calculate_interest_rate(12000, 9000),
+        "calculate_monthly_payment": lambda: service.calculate_monthly_payment(12000, 12, 2.5),
+        "calculate_total_amount": lambda: service.calculate_total_amount(12000, 12, 2.5),
+        "build_loan_records": lambda: service.build_loan_records(application),
+    }
+    vector_cases = {
+        "interest_rates": lambda: pricing.interest_rates(amounts, incomes),
+        "total_amounts": lambda: pricing.total_amounts(amounts, terms, rates),
+        "monthly_payments": lambda: pricing.monthly_payments(amounts, terms, rates),
+        "affordable_payments": lambda: pricing.affordable_payments(incomes, expenses),
+        "max_loan_amounts": lambda: pricing.max_loan_amounts(incomes, expenses, terms),
+    }
+
+    results: Dict[str, Dict] = {}
+    print(f"{'case':<34} {'per call':>12} {'per loan':>12}")
+    for name, function in scalar_cases.items():
+        seconds = time_per_call(function, args.calls, args.repeat)
+        results[f"scalar.{name}.ns"] = metric(seconds * 1e9, LOWER_IS_BETTER)
+        print(f"{'scalar ' + name:<34} {seconds * 1e9:>9.0f} ns {seconds * 1e9:>9.0f} ns")
+    for name, function in vector_cases.items():
+        seconds = time_per_call(function, max(args.calls // 1000, 10), args.repeat)
+        results[f"vector.{name}.ns_per_loan"] = metric(seconds / args.size * 1e9, LOWER_IS_BETTER)
+        print(f"{'vector ' + name:<34} {seconds * 1e6:>9.0f} us {seconds / args.size * 1e9:>9.1f} ns")
+
+    config = {"size": args.size, "calls": args.calls, "seed": args.seed}
+    if args.save:
+        save_results(args.save, "pricing", config, results)
+    if args.baseline and not compare(args.baseline, "pricing", config, results, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loan pricing micro-benchmarks")
+    parser.add_argument("--size", type=int, default=100_000, help="loans per vectorized call")
+    parser.add_argument("--calls", type=int, default=20_000, help="calls per timed scalar run")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="allowed regression in percent")
+    sys.exit(main(parser.parse_args()))
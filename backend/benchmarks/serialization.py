@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+serialization.py
+
+Serialization cost of a 1,000-loan GET /api/loans response: FastAPI's
+reflective jsonable_encoder walk over raw SQLAlchemy objects (the old path)
+against LoanListEnvelope validation from ORM attributes rendered by orjson.
+
+  python benchmarks/serialization.py --loans 1000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SESSION_SIGNING_KEYS", "bench:" + "k" * 32)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from main import Loan, LoanListEnvelope, ORJSONResponse  # noqa: E402
+
+
+def make_loans(count: int):
+    now = datetime.utcnow()
+    return [
+        Loan(
+            id=str(uuid.uuid4()), application_id=str(uuid.uuid4()), user_id="bench@buffr.ai",
+            amount=5000.0, term_months=12, interest_rate=2.5, monthly_payment=541.67,
+            total_amount=6500.0, status="active", disbursement_date=now, maturity_date=now,
+            next_payment_date=now, principal_balance=5000.0, interest_balance=0.0,
+            total_paid=1000.0, remaining_balance=4000.0, created_at=now, updated_at=now,
+        )
+        for _ in range(count)
+    ]
+
+
+def envelope(loans):
+    return {
+        "success": True,
+        "data": loans,
+        "pagination": {"limit": len(loans), "next_cursor": None},
+        "message": "Loans retrieved successfully",
+    }
+
+
+def old_path(loans) -> bytes:
+    return json.dumps(jsonable_encoder(envelope(loans)), ensure_ascii=False,
+                      separators=(",", ":")).encode()
+
+
+def new_path(loans) -> bytes:
+    content = LoanListEnvelope.model_validate(envelope(loans)).model_dump(mode="json")
+    return ORJSONResponse(content).body
+
+
+def measure(label: str, render, loans, repeat: int) -> float:
+    render(loans)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(loans)
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    print(f"{label:<40} median {median * 1000:8.2f} ms   min {min(samples) * 1000:8.2f} ms")
+    return median
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loan list serialization benchmark")
+    parser.add_argument("--loans", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    loans = make_loans(args.loans)
+    print(f"{args.loans} loans, {args.repeat} repetitions")
+    before = measure("jsonable_encoder + json (before)", old_path, loans, args.repeat)
+    after = measure("response model + orjson (after)", new_path, loans, args.repeat)
+    print(f"speed-up: {before / after:.1f}x")
@@ -0,0 +1,234 @@
+"""
+Nightly accrual and delinquency batch job.
+
+For every disbursed loan that is still open ("active" or "overdue") the job
+derives, as of the run date:
+
+- periods due: instalment dates (monthly from disbursement) on or before the run date
+- interest_balance: flat-rate interest accrued for those periods
+- remaining_balance: principal plus accrued interest and manual adjustments,
+  less total_paid
+- next_payment_date and maturity_date
+- status: "overdue" when total_paid is behind the instalments due, else "active"
+
+Everything is derived from the loan's pricing and the run date, so applying a
+chunk twice gives the same result; a crashed run can resume from its last
+checkpoint without double-accruing. Balances are written with SQL relative to
+the row's current total_paid and adjustments_total, so payments and
+adjustments posted while the job runs are not lost.
+
+Loans are read through a server-side cursor in id order and written in
+fixed-size chunks with executemany UPDATEs. Each chunk commits together with
+its ledger entries (the change in accrued interest), the company aggregate
+deltas and its checkpoint. The id space can be split into partitions processed by
+separate worker processes:
+
+  python accrual.py                       # as of today, single process
+  python accrual.py --as-of 2026-10-31 --partitions 8 --workers 8
+"""
+
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis as redis_sync
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, update
+
+from database import SessionLocal, get_engine
+from loan_cache import bump_versions
+from main import (
+    LEDGER_ACCRUAL, REDIS_URL, JobCheckpoint, LedgerEntry, Loan, LoanApplication, add_portfolio_delta,
+    company_portfolio_upsert, ledger_entry, portfolio_delta_rows,
+)
+from schedules import add_months
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+CLOSED_STATUS = "completed"
+# Pending loans have not been paid out yet, so they accrue nothing
+ACCRUING_STATUSES = ("active", "overdue")
+# Tolerance for rounding when comparing amounts paid against amounts due
+PAYMENT_TOLERANCE = 0.01
+
+
+def partition_bounds(partition: int, partitions: int) -> Tuple[Optional[str], Optional[str]]:
+    """[low, high) bounds on the loan id for one partition of the (hex UUID) id space"""
+    def boundary(index: int) -> Optional[str]:
+        if index <= 0 or index >= partitions:
+            return None
+        return format(index * 256 // partitions, "02x")
+
+    return boundary(partition), boundary(partition + 1)
+
+
+def periods_due(disbursed: datetime, term_months: int, as_of: datetime) -> int:
+    """Number of instalment dates on or before ``as_of`` (capped at the term)"""
+    months = (as_of.year - disbursed.year) * 12 + as_of.month - disbursed.month
+    if months > 0 and add_months(disbursed, months) > as_of:
+        months -= 1
+    return max(0, min(term_months, months))
+
+
+def accrual_params(loan, as_of: datetime) -> Dict[str, Any]:
+    """Bind parameters for one loan's accrual UPDATE"""
+    due = periods_due(loan.disbursement_date, loan.term_months, as_of)
+    interest = round(loan.amount * loan.interest_rate / 100 * due, 2)
+    return {
+        "target_id": loan.id,
+        "interest_accrued": interest,
+        "principal_and_interest": loan.amount + interest,
+        "expected_paid": round(loan.monthly_payment * due, 2),
+        "next_payment": add_months(loan.disbursement_date, due + 1) if due < loan.term_months else None,
+        "maturity": add_months(loan.disbursement_date, loan.term_months),
+    }
+
+
+def accrual_update():
+    loans = Loan.__table__
+    paid = func.coalesce(loans.c.total_paid, 0)
+    remaining = bindparam("principal_and_interest") + loans.c.adjustments_total - paid
+    return (
+        update(loans)
+        # An IN list would be an expanding parameter, which executemany can't take
+        .where(loans.c.id == bindparam("target_id"), or_(*(loans.c.status == value for value in ACCRUING_STATUSES)))
+        .values(
+            interest_balance=bindparam("interest_accrued"),
+            remaining_balance=case((remaining < 0, 0), else_=remaining),
+            next_payment_date=bindparam("next_payment"),
+            maturity_date=bindparam("maturity"),
+            status=case((paid + PAYMENT_TOLERANCE < bindparam("expected_paid"), "overdue"), else_="active"),
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+def accrue_chunk(db, statement, rows, as_of: datetime) -> None:
+    """Accrue one chunk, with its ledger entries and portfolio deltas in the same transaction"""
+    # Re-read under row locks: payments may have moved or completed these loans since the cursor read them
+    current = {
+        loan.id: loan for loan in db.execute(
+            select(Loan.id, Loan.status, Loan.interest_balance, Loan.remaining_balance, Loan.total_paid,
+                   Loan.adjustments_total, LoanApplication.company_id)
+            .join(LoanApplication, LoanApplication.id == Loan.application_id, isouter=True)
+            .where(Loan.id.in_([row.id for row in rows]), Loan.status.in_(ACCRUING_STATUSES))
+            .order_by(Loan.id)
+            .with_for_update(of=Loan)
+        )
+    }
+
+    params: List[Dict[str, Any]] = []
+    entries: List[Dict[str, Any]] = []
+    deltas: Dict[str, Dict[str, float]] = {}
+    for row in rows:
+        loan = current.get(row.id)
+        if loan is None:
+            continue
+        values = accrual_params(row, as_of)
+        params.append(values)
+
+        interest = values["interest_accrued"] - (loan.interest_balance or 0)
+        if interest:
+            entries.append(ledger_entry(row.id, LEDGER_ACCRUAL, interest))
+        # Mirrors accrual_update's SQL so the company aggregates stay exact
+        paid = loan.total_paid or 0
+        remaining = max(values["principal_and_interest"] + loan.adjustments_total - paid, 0)
+        overdue = paid + PAYMENT_TOLERANCE < values["expected_paid"]
+        add_portfolio_delta(
+            deltas, loan.company_id,
+            outstanding_balance=remaining - loan.remaining_balance,
+            delinquent_count=int(overdue) - int(loan.status == "overdue"),
+        )
+
+    if params:
+        db.execute(statement, params)
+    if entries:
+        db.execute(insert(LedgerEntry), entries)
+    if deltas:
+        db.execute(company_portfolio_upsert(get_engine().dialect.name), portfolio_delta_rows(deltas))
+
+
+def load_checkpoint(db, job_name: str) -> JobCheckpoint:
+    checkpoint = db.get(JobCheckpoint, job_name)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(job_name=job_name, processed=0)
+        db.add(checkpoint)
+        db.commit()
+    return checkpoint
+
+
+def run_partition(as_of: date, partition: int, partitions: int, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Accrue one id-range partition, resuming from its checkpoint"""
+    # Connections inherited from a parent process must not be reused
+    get_engine().dispose(close=False)
+
+    as_of_dt = datetime.combine(as_of, datetime.max.time())
+    job_name = f"accrual:{as_of.isoformat()}:{partition}/{partitions}"
+    low, high = partition_bounds(partition, partitions)
+    started = time.perf_counter()
+
+    cache = redis_sync.Redis.from_url(REDIS_URL)
+    with cache, SessionLocal() as writer:
+        checkpoint = load_checkpoint(writer, job_name)
+        if checkpoint.completed_at is not None:
+            return {"partition": partition, "processed": checkpoint.processed, "skipped": True}
+
+        conditions = [Loan.disbursement_date.isnot(None), Loan.status.in_(ACCRUING_STATUSES)]
+        if low is not None:
+            conditions.append(Loan.id >= low)
+        if high is not None:
+            conditions.append(Loan.id < high)
+        if checkpoint.last_key:
+            conditions.append(Loan.id > checkpoint.last_key)
+
+        query = (
+            select(Loan.id, Loan.user_id, Loan.amount, Loan.term_months, Loan.interest_rate,
+                   Loan.monthly_payment, Loan.disbursement_date)
+            .where(and_(*conditions))
+            .order_by(Loan.id)
+        )
+
+        statement = accrual_update()
+        # Reads stream on their own connection; each chunk commits on the writer with its checkpoint
+        with get_engine().connect() as reader:
+            result = reader.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                accrue_chunk(writer, statement, rows, as_of_dt)
+                checkpoint.last_key = rows[-1].id
+                checkpoint.processed += len(rows)
+                writer.commit()
+                bump_versions(cache, {row.user_id for row in rows})
+
+        checkpoint.completed_at = datetime.utcnow()
+        writer.commit()
+        processed = checkpoint.processed
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"{job_name}: {processed} loans in {elapsed:.1f}s")
+    return {"partition": partition, "processed": processed, "elapsed_seconds": elapsed}
+
+
+def run(as_of: date, partitions: int = 1, workers: int = 1, chunk_size: int = CHUNK_SIZE) -> List[Dict[str, Any]]:
+    if workers <= 1:
+        return [run_partition(as_of, partition, partitions, chunk_size) for partition in range(partitions)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_partition, as_of, partition, partitions, chunk_size) for partition in range(partitions)]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nightly loan accrual and delinquency job")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--partitions", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run(args.as_of, args.partitions, args.workers, args.chunk_size)
+    total = sum(result["processed"] for result in results)
+    print(f"accrual as of {args.as_of}: {total} loans across {args.partitions} partitions "
+          f"in {time.perf_counter() - started:.1f}s")
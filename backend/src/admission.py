@@ -0,0 +1,257 @@
+"""
+Admission control and load shedding.
+
+Every request is put in a route class by method and path prefix. A class
+admits up to ``limit`` requests at once and queues up to ``max_queue`` more
+for at most ``queue_timeout`` seconds; past that it answers 503 with
+Retry-After straight away instead of joining a pile-up on the connection
+pool. Classes are independent, so a flood of listings cannot use up the
+slots payments need.
+
+On top of the per-class bounds, the request path's pool checkout wait
+(metrics.TimedPool.checkout_pressure) sheds whole priorities: past
+``max_checkout_wait`` the low class is refused, past twice that the normal
+class too, past four times the high class. Critical requests (payments) are
+only ever bounded by their own class.
+
+Login attempts are throttled separately by LoginRateLimiter: a sliding
+window per email and per client address, kept in Redis sorted sets and
+checked and recorded by one Lua script call.
+"""
+
+import asyncio
+import logging
+import math
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CRITICAL, HIGH, NORMAL, LOW = 0, 1, 2, 3
+# Pressure multiple of max_checkout_wait at which each priority is shed
+SHED_AT = {LOW: 1, NORMAL: 2, HIGH: 4}
+MAX_RETRY_AFTER = 30
+
+ADMISSION_REJECTED = metrics.registry.counter(
+    "admission_rejected_total", "Requests refused by admission control", ("route_class", "reason")
+)
+
+
+class RouteClass:
+    """Concurrency limit with a bounded FIFO queue"""
+
+    def __init__(self, name: str, priority: int, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns the rejection reason if none came free in time"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away while queued; pass on a slot handed to us, or leave the queue
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        if waiter.done():
+            # release() handed its slot over
+            return None
+        waiter.cancel()
+        self._waiters.remove(waiter)
+        return "queue_timeout"
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+# (method or None for any, path prefix, class name); first match wins
+DEFAULT_RULES: Sequence[Tuple[Optional[str], str, str]] = (
+    ("POST", "/api/payments", "payments"),
+    ("POST", "/api/loans", "applications"),
+    (None, "/api/auth/", "auth"),
+    (None, "/hospitality-property-loans", "scoring"),
+    ("GET", "/api/loans", "listings"),
+    (None, "/api/portfolio", "reporting"),
+    (None, "/api/cache/", "reporting"),
+    (None, "/api/outbox/", "reporting"),
+)
+# Never limited: health checks, scrapes and profile downloads must answer while shedding
+EXEMPT_PATHS = ("/metrics", "/api/admin/", "/docs", "/openapi.json")
+
+
+def default_classes(connections: int) -> Dict[str, RouteClass]:
+    """Route classes sized against the request path's pool (pool_size + max_overflow connections)"""
+    connections = max(connections, 1)
+    return {
+        "payments": RouteClass("payments", CRITICAL, connections, connections * 4, 5.0),
+        "applications": RouteClass("applications", HIGH, connections, connections * 2, 2.0),
+        "auth": RouteClass("auth", HIGH, connections, connections * 2, 1.0),
+        "default": RouteClass("default", NORMAL, connections, connections * 2, 1.0),
+        "scoring": RouteClass("scoring", NORMAL, max(connections // 2, 1), connections, 2.0),
+        "listings": RouteClass("listings", LOW, connections, connections, 0.5),
+        "reporting": RouteClass("reporting", LOW, max(connections // 4, 1), connections // 2, 0.5),
+    }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the route classes and pool-pressure shedding"""
+
+    def __init__(self, app, classes: Dict[str, RouteClass], pressure: Callable[[], float],
+                 max_checkout_wait: float, rules: Sequence[Tuple[Optional[str], str, str]] = DEFAULT_RULES):
+        self.app = app
+        self.classes = classes
+        self.pressure = pressure
+        self.max_checkout_wait = max_checkout_wait
+        self.rules = rules
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        if path == "/" or path.startswith(EXEMPT_PATHS):
+            return None
+        for rule_method, prefix, name in self.rules:
+            if (rule_method is None or rule_method == method) and path.startswith(prefix):
+                return self.classes[name]
+        return self.classes["default"]
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        pressure = self.pressure()
+        shed_at = SHED_AT.get(route_class.priority)
+        if shed_at is not None and pressure > self.max_checkout_wait * shed_at:
+            await self.reject(send, route_class, "pool_pressure", pressure)
+            return
+
+        reason = await route_class.acquire()
+        if reason is not None:
+            await self.reject(send, route_class, reason, pressure)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+    async def reject(self, send, route_class: RouteClass, reason: str, pressure: float) -> None:
+        ADMISSION_REJECTED.inc(1, route_class.name, reason)
+        retry_after = min(max(math.ceil(pressure * 2), 1), MAX_RETRY_AFTER)
+        body = orjson.dumps({"detail": "Service is busy, please retry"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def register_gauges(classes: Dict[str, RouteClass], pressure: Callable[[], float]) -> None:
+    metrics.registry.callback_gauge(
+        "admission_in_flight", "Requests admitted and running, per route class", ("route_class",),
+        lambda: [((name,), route_class.in_flight) for name, route_class in classes.items()],
+    )
+    metrics.registry.callback_gauge(
+        "admission_queued", "Requests waiting for a slot, per route class", ("route_class",),
+        lambda: [((name,), route_class.queued) for name, route_class in classes.items()],
+    )
+    metrics.registry.callback_gauge(
+        "admission_pool_pressure_seconds", "Recent pool checkout wait seen by admission control", (),
+        lambda: [((), pressure())],
+    )
+
+
+# KEYS: one sorted set per window; ARGV: window in ms, then each key's limit, then a unique member.
+# Every window is checked before any is recorded, so a refused attempt does not count against the others.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local window = tonumber(ARGV[1])
+local member = ARGV[#ARGV]
+local retry_after = 0
+for index, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local limit = tonumber(ARGV[index + 1])
+    if limit > 0 and redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now)
+    end
+end
+if retry_after > 0 then
+    return retry_after
+end
+for index, key in ipairs(KEYS) do
+    if tonumber(ARGV[index + 1]) > 0 then
+        redis.call('ZADD', key, now, member)
+        redis.call('PEXPIRE', key, window)
+    end
+end
+return 0
+"""
+
+
+class LoginRateLimiter:
+    """Sliding-window login throttle per email and per client address (a limit of 0 disables it)"""
+
+    def __init__(self, per_email: int, per_address: int, window_seconds: float):
+        self.per_email = per_email
+        self.per_address = per_address
+        self.window_ms = int(window_seconds * 1000)
+        self._script = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_email > 0 or self.per_address > 0
+
+    async def check(self, redis_conn, email: str, address: Optional[str]) -> Optional[int]:
+        """Record an attempt; returns seconds to wait when over a limit, else None. Fails open on Redis errors."""
+        keys: List[str] = [f"ratelimit:login:email:{email.strip().lower()}"]
+        limits = [self.per_email]
+        if address:
+            keys.append(f"ratelimit:login:addr:{address}")
+            limits.append(self.per_address)
+
+        if self._script is None:
+            self._script = redis_conn.register_script(SLIDING_WINDOW_SCRIPT)
+        try:
+            with metrics.REDIS_COMMAND_DURATION.time("login_rate_limit"):
+                retry_after_ms = await self._script(
+                    keys=keys, args=[self.window_ms, *limits, uuid.uuid4().hex], client=redis_conn
+                )
+        except Exception as e:
+            logger.error(f"Login rate limit check failed: {e}")
+            return None
+        return math.ceil(int(retry_after_ms) / 1000) if retry_after_ms else None
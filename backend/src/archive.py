@@ -0,0 +1,461 @@
+"""
+Archival of closed loans to Parquet files, and upkeep of the payments
+partitions.
+
+Loans completed more than ARCHIVE_AFTER_DAYS ago are moved out of the hot
+tables in chunks taken in loan id order. Each chunk's loans, their
+applications, payments and ledger entries are written to one Parquet file
+per table under ARCHIVE_DIR, each sorted by loan id so its row-group
+statistics narrow any lookup to a few row groups. The same transaction then
+deletes those rows, and the loans' balance snapshots, takes the loans out of
+their company's outstanding and delinquent totals, moves their lifetime
+totals (loan count, disbursed, paid) into archived_portfolios, where
+reconcile.py adds them back, and records the chunk's checkpoint.
+
+Files are written and fsynced under a leading underscore, which readers
+ignore, and renamed into place only after that transaction commits. A run
+that died in between is settled by the next one: pending files whose loans
+are gone from the database are renamed into place, any others are removed
+and their loans archived again. File names carry the chunk's first and last
+loan id, so a lookup opens only files whose range covers the loan.
+
+On Postgres payments are partitioned by month (migration 0002); the
+``partitions`` command creates the coming months ahead of time, moving any
+rows that already landed in the default partition.
+
+  python archive.py run                        # archive loans closed more than ARCHIVE_AFTER_DAYS ago
+  python archive.py run --older-than-days 30 --chunk-size 500
+  python archive.py partitions --ahead 3
+  python archive.py lookup LOAN_ID             # one loan's archived rows as NDJSON
+  python archive.py status
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import redis as redis_sync
+from sqlalchemy import delete, func, select, text
+
+from accrual import CLOSED_STATUS, load_checkpoint
+from database import SessionLocal, get_engine
+from loan_cache import bump_versions
+from main import (
+    ARCHIVED_TOTALS, REDIS_URL, ArchivedPortfolio, LedgerEntry, Loan, LoanApplication, LoanBalanceSnapshot, Payment,
+    add_portfolio_delta, company_portfolio_upsert, portfolio_delta_rows, upsert_insert,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "/var/lib/buffrlend/archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+CHUNK_SIZE = 1000
+# Rows per Parquet row group; the unit a lookup reads once statistics have ruled the others out
+ROW_GROUP_SIZE = 1024
+PARTITION_MONTHS_AHEAD = 3
+
+PENDING_PREFIX = "_"
+SUFFIX = ".parquet"
+# Archived tables, each with the column lookups filter on; loans is written last and renamed last
+TABLES = {"payments": "loan_id", "ledger_entries": "loan_id", "loan_applications": "loan_id", "loans": "id"}
+
+# JSON columns are archived as their JSON text
+ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64(), datetime: pa.timestamp("us"), object: pa.string()}
+
+
+def arrow_schema(table, *extra: pa.Field) -> pa.Schema:
+    """Arrow schema for a table's columns, so every file gets the same types whatever its values"""
+    return pa.schema([pa.field(column.name, ARROW_TYPES[column.type.python_type]) for column in table.columns]
+                     + list(extra))
+
+
+SCHEMAS = {
+    "loans": arrow_schema(Loan.__table__, pa.field("company_id", pa.string()),
+                          pa.field("archived_at", pa.timestamp("us"))),
+    "payments": arrow_schema(Payment.__table__),
+    "ledger_entries": arrow_schema(LedgerEntry.__table__),
+    # Applications have no loan id of their own; it is added so lookups by loan id find them
+    "loan_applications": arrow_schema(LoanApplication.__table__, pa.field("loan_id", pa.string())),
+}
+
+
+def archived_portfolio_upsert(dialect_name: str):
+    """INSERT ... ON CONFLICT adding each row's archived loans to its company's archived totals"""
+    archived_table = ArchivedPortfolio.__table__
+    statement = upsert_insert(dialect_name, archived_table)
+    totals = {name: archived_table.c[name] + statement.excluded[name] for name in ARCHIVED_TOTALS}
+    return statement.on_conflict_do_update(
+        index_elements=[archived_table.c.company_id],
+        set_={**totals, "updated_at": datetime.utcnow()},
+    )
+
+
+def month_start(day: date, months: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(ahead: int = PARTITION_MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Create monthly payments partitions through ``ahead`` months from now; returns those created"""
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        return []
+    today = today or date.today()
+    created = []
+    with engine.begin() as connection:
+        existing = set(connection.scalars(text(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+            " WHERE parent.relname = 'payments'"
+        )))
+        for offset in range(ahead + 1):
+            low, high = month_start(today, offset), month_start(today, offset + 1)
+            name = f"payments_{low:%Y_%m}"
+            if name in existing:
+                continue
+            # A partition can't be created over rows already in the default one, so those move first
+            connection.execute(text(f"CREATE TABLE {name} (LIKE payments INCLUDING DEFAULTS)"))
+            connection.execute(text(
+                f"WITH moved AS (DELETE FROM payments_default"
+                f" WHERE payment_date >= :low AND payment_date < :high RETURNING *)"
+                f" INSERT INTO {name} SELECT * FROM moved"
+            ), {"low": low, "high": high})
+            connection.execute(text(
+                f"ALTER TABLE payments ATTACH PARTITION {name} FOR VALUES FROM ('{low}') TO ('{high}')"
+            ))
+            created.append(name)
+    return created
+
+
+def fsync_directory(path: str) -> None:
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def write_pending(directory: str, table: str, batch: str, rows: List[Dict[str, Any]]) -> None:
+    """Write one table's rows for a chunk, sorted by loan id, and fsync before anything is deleted"""
+    key = TABLES[table]
+    path = os.path.join(directory, table, f"{PENDING_PREFIX}{batch}{SUFFIX}")
+    # Byte order, which row-group statistics use; the sort is stable, so each loan keeps the query's order
+    columnar = pa.Table.from_pylist(rows, schema=SCHEMAS[table]).sort_by(key)
+    with open(path, "wb") as sink:
+        pq.write_table(columnar, sink, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        sink.flush()
+        os.fsync(sink.fileno())
+
+
+def finalize(directory: str, batch: str) -> None:
+    """Rename a committed chunk's files into place, loans last"""
+    for table in TABLES:
+        folder = os.path.join(directory, table)
+        pending = os.path.join(folder, f"{PENDING_PREFIX}{batch}{SUFFIX}")
+        if os.path.exists(pending):
+            os.replace(pending, os.path.join(folder, f"{batch}{SUFFIX}"))
+            fsync_directory(folder)
+
+
+def discard(directory: str, batch: str) -> None:
+    for table in TABLES:
+        pending = os.path.join(directory, table, f"{PENDING_PREFIX}{batch}{SUFFIX}")
+        if os.path.exists(pending):
+            os.remove(pending)
+
+
+def pending_batches(directory: str, table: str) -> List[str]:
+    names = os.listdir(os.path.join(directory, table))
+    return [name[len(PENDING_PREFIX):-len(SUFFIX)] for name in names
+            if name.startswith(PENDING_PREFIX) and name.endswith(SUFFIX)]
+
+
+def recover_pending(db, directory: str) -> Dict[str, int]:
+    """Settle chunks left pending by a run that stopped between writing files and renaming them"""
+    finalized = discarded = 0
+    for batch in pending_batches(directory, "loans"):
+        try:
+            ids = pq.read_table(
+                os.path.join(directory, "loans", f"{PENDING_PREFIX}{batch}{SUFFIX}"), columns=["id"]
+            ).column("id").to_pylist()
+        except (OSError, pa.ArrowInvalid):
+            # Torn while being written, so its chunk never committed
+            ids = None
+        # A chunk's loans are deleted in one transaction: all gone means it committed
+        if ids is not None and not db.scalar(select(func.count()).select_from(Loan).where(Loan.id.in_(ids))):
+            finalize(directory, batch)
+            finalized += 1
+        else:
+            discard(directory, batch)
+            discarded += 1
+    # Other tables' files without a loans file were written by a chunk that never committed
+    for table in (table for table in TABLES if table != "loans"):
+        for batch in pending_batches(directory, table):
+            discard(directory, batch)
+            discarded += 1
+    return {"finalized": finalized, "discarded": discarded}
+
+
+def archive_chunk(db, loan_ids: List[str], directory: str, cutoff: datetime) -> Optional[Dict[str, Any]]:
+    """Write one chunk's rows to pending files and delete them from the hot tables, uncommitted"""
+    loans_table, payments_table, entries_table = Loan.__table__, Payment.__table__, LedgerEntry.__table__
+    applications_table = LoanApplication.__table__
+    # Locked so a late adjustment either lands before the rows are read or finds the loan gone
+    loans = [
+        dict(row._mapping) for row in db.execute(
+            select(loans_table, LoanApplication.company_id)
+            .join(LoanApplication, LoanApplication.id == loans_table.c.application_id, isouter=True)
+            .where(loans_table.c.id.in_(loan_ids), loans_table.c.status == CLOSED_STATUS,
+                   loans_table.c.updated_at < cutoff)
+            .order_by(loans_table.c.id)
+            .with_for_update(of=loans_table)
+        )
+    ]
+    if not loans:
+        return None
+    ids = [loan["id"] for loan in loans]
+    payments = [dict(row._mapping) for row in db.execute(
+        select(payments_table).where(payments_table.c.loan_id.in_(ids))
+        .order_by(payments_table.c.loan_id, payments_table.c.payment_date)
+    )]
+    entries = [dict(row._mapping) for row in db.execute(
+        select(entries_table).where(entries_table.c.loan_id.in_(ids))
+        .order_by(entries_table.c.loan_id, entries_table.c.sequence)
+    )]
+    applications = [dict(row._mapping) for row in db.execute(
+        select(applications_table, loans_table.c.id.label("loan_id"))
+        .join(loans_table, loans_table.c.application_id == applications_table.c.id)
+        .where(loans_table.c.id.in_(ids))
+        .order_by(loans_table.c.id)
+    )]
+    for application in applications:
+        if application["employment_info"] is not None:
+            application["employment_info"] = json.dumps(application["employment_info"])
+
+    archived_at = datetime.utcnow()
+    for loan in loans:
+        loan["archived_at"] = archived_at
+    batch = f"{min(ids)}_{max(ids)}_{archived_at:%Y%m%dT%H%M%S%f}"
+    write_pending(directory, "payments", batch, payments)
+    write_pending(directory, "ledger_entries", batch, entries)
+    write_pending(directory, "loan_applications", batch, applications)
+    write_pending(directory, "loans", batch, loans)
+
+    if payments:
+        # Bounding payment_date lets Postgres skip the partitions these loans never paid into
+        dates = [payment["payment_date"] for payment in payments]
+        db.execute(delete(payments_table).where(
+            payments_table.c.loan_id.in_(ids), payments_table.c.payment_date.between(min(dates), max(dates))
+        ))
+    db.execute(delete(entries_table).where(entries_table.c.loan_id.in_(ids)))
+    db.execute(delete(LoanBalanceSnapshot.__table__).where(LoanBalanceSnapshot.__table__.c.loan_id.in_(ids)))
+    db.execute(delete(loans_table).where(loans_table.c.id.in_(ids)))
+    db.execute(delete(applications_table).where(
+        applications_table.c.id.in_([application["id"] for application in applications])
+    ))
+
+    # The loans leave the current totals; their lifetime totals move to archived_portfolios unchanged
+    deltas: Dict[str, Dict[str, float]] = {}
+    archived: Dict[str, Dict[str, float]] = {}
+    for loan in loans:
+        add_portfolio_delta(
+            deltas, loan["company_id"],
+            outstanding_balance=-loan["remaining_balance"],
+            delinquent_count=-int(loan["status"] == "overdue"),
+        )
+        if loan["company_id"] is not None:
+            totals = archived.setdefault(loan["company_id"], dict.fromkeys(ARCHIVED_TOTALS, 0))
+            totals["loan_count"] += 1
+            totals["total_disbursed"] += loan["amount"]
+            totals["total_paid"] += loan["total_paid"] or 0
+    if deltas:
+        dialect_name = get_engine().dialect.name
+        db.execute(company_portfolio_upsert(dialect_name), portfolio_delta_rows(deltas))
+        db.execute(archived_portfolio_upsert(dialect_name),
+                   [{"company_id": company_id, **archived[company_id]} for company_id in sorted(archived)])
+
+    return {
+        "batch": batch,
+        "user_ids": {loan["user_id"] for loan in loans},
+        "loans": len(loans),
+        "payments": len(payments),
+        "ledger_entries": len(entries),
+        "loan_applications": len(applications),
+    }
+
+
+def run(older_than_days: int = ARCHIVE_AFTER_DAYS, chunk_size: int = CHUNK_SIZE, directory: str = ARCHIVE_DIR,
+        as_of: Optional[date] = None) -> Dict[str, Any]:
+    """Archive loans closed before the cutoff, resuming from the day's checkpoint"""
+    as_of = as_of or date.today()
+    cutoff = datetime.combine(as_of, datetime.min.time()) - timedelta(days=older_than_days)
+    job_name = f"archive:{as_of.isoformat()}"
+    for table in TABLES:
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+    started = time.perf_counter()
+    totals = dict.fromkeys(("loans", "loan_applications", "payments", "ledger_entries", "files"), 0)
+
+    cache = redis_sync.Redis.from_url(REDIS_URL)
+    with cache, SessionLocal() as db:
+        recovered = recover_pending(db, directory)
+        checkpoint = load_checkpoint(db, job_name)
+        if checkpoint.completed_at is not None:
+            return {"processed": checkpoint.processed, "skipped": True}
+
+        while True:
+            # Keyset pages rather than one long cursor: every page's rows are deleted before the next read
+            query = (
+                select(Loan.id)
+                .where(Loan.status == CLOSED_STATUS, Loan.updated_at < cutoff)
+                .order_by(Loan.id)
+                .limit(chunk_size)
+            )
+            if checkpoint.last_key:
+                query = query.where(Loan.id > checkpoint.last_key)
+            loan_ids = list(db.scalars(query))
+            if not loan_ids:
+                break
+
+            chunk = archive_chunk(db, loan_ids, directory, cutoff)
+            checkpoint.last_key = loan_ids[-1]
+            if chunk is not None:
+                checkpoint.processed += chunk["loans"]
+            db.commit()
+            if chunk is None:
+                continue
+
+            finalize(directory, chunk["batch"])
+            # Archived loans leave their owners' listings
+            bump_versions(cache, chunk["user_ids"])
+            for name in TABLES:
+                totals[name] += chunk[name]
+            totals["files"] += len(TABLES)
+
+        checkpoint.completed_at = datetime.utcnow()
+        db.commit()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"{job_name}: archived {totals['loans']} loans, {totals['payments']} payments "
+                f"in {elapsed:.1f}s")
+    return {**totals, "recovered": recovered, "cutoff": cutoff, "elapsed_seconds": elapsed}
+
+
+class ArchiveReader:
+    """Streams a loan's archived rows, opening only the files and row groups whose loan id range covers it"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+
+    def files(self, table: str, loan_id: str) -> List[str]:
+        folder = os.path.join(self.directory, table)
+        try:
+            names = sorted(os.listdir(folder))
+        except FileNotFoundError:
+            return []
+        found = []
+        for name in names:
+            if name.startswith(PENDING_PREFIX) or not name.endswith(SUFFIX):
+                continue
+            first, last, _ = name[:-len(SUFFIX)].split("_")
+            if first <= loan_id <= last:
+                found.append(os.path.join(folder, name))
+        return found
+
+    def rows(self, table: str, loan_id: str) -> Iterator[Dict[str, Any]]:
+        key = TABLES[table]
+        for path in self.files(table, loan_id):
+            with pq.ParquetFile(path) as parquet:
+                column = parquet.schema_arrow.get_field_index(key)
+                for index in range(parquet.num_row_groups):
+                    statistics = parquet.metadata.row_group(index).column(column).statistics
+                    if statistics is not None and statistics.has_min_max and not (
+                        statistics.min <= loan_id <= statistics.max
+                    ):
+                        continue
+                    group = parquet.read_row_group(index)
+                    yield from group.filter(pc.equal(group[key], loan_id)).to_pylist()
+
+    def loan(self, loan_id: str) -> Optional[Dict[str, Any]]:
+        return next(self.rows("loans", loan_id), None)
+
+    def application(self, loan_id: str) -> Optional[Dict[str, Any]]:
+        application = next(self.rows("loan_applications", loan_id), None)
+        if application is not None and application["employment_info"] is not None:
+            application["employment_info"] = json.loads(application["employment_info"])
+        return application
+
+    def history(self, loan_id: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """The loan's application, its payments in date order, then its ledger entries in sequence order"""
+        application = self.application(loan_id)
+        if application is not None:
+            yield "application", application
+        for payment in self.rows("payments", loan_id):
+            yield "payment", payment
+        for entry in self.rows("ledger_entries", loan_id):
+            yield "ledger_entry", entry
+
+
+def status(directory: str = ARCHIVE_DIR) -> Dict[str, Any]:
+    """Rows left in the hot tables next to rows and files in the archive"""
+    with SessionLocal() as db:
+        hot = {
+            "loans": db.scalar(select(func.count()).select_from(Loan)),
+            "loan_applications": db.scalar(select(func.count()).select_from(LoanApplication)),
+            "closed_loans": db.scalar(select(func.count()).select_from(Loan).where(Loan.status == CLOSED_STATUS)),
+            "payments": db.scalar(select(func.count()).select_from(Payment)),
+            "ledger_entries": db.scalar(select(func.count()).select_from(LedgerEntry)),
+        }
+    archived = {}
+    for table in TABLES:
+        folder = os.path.join(directory, table)
+        names = [name for name in os.listdir(folder) if name.endswith(SUFFIX)] if os.path.isdir(folder) else []
+        archived[table] = {
+            "files": sum(not name.startswith(PENDING_PREFIX) for name in names),
+            "pending": sum(name.startswith(PENDING_PREFIX) for name in names),
+            "rows": sum(pq.ParquetFile(os.path.join(folder, name)).metadata.num_rows
+                        for name in names if not name.startswith(PENDING_PREFIX)),
+            "bytes": sum(os.path.getsize(os.path.join(folder, name)) for name in names),
+        }
+    return {"hot": hot, "archived": archived}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Closed-loan archival and payments partition upkeep")
+    parser.add_argument("--directory", default=ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="move loans closed before the cutoff into the archive")
+    run_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    run_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    run_parser.add_argument("--as-of", type=date.fromisoformat, default=date.today())
+    partitions_parser = commands.add_parser("partitions", help="create upcoming monthly payments partitions")
+    partitions_parser.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    lookup_parser = commands.add_parser("lookup", help="print one loan's archived rows as NDJSON")
+    lookup_parser.add_argument("loan_id")
+    commands.add_parser("status", help="hot table sizes next to archive sizes")
+    args = parser.parse_args()
+
+    if args.command == "lookup":
+        reader = ArchiveReader(args.directory)
+        loan = reader.loan(args.loan_id)
+        if loan is not None:
+            print(json.dumps({"loan": loan}, default=str))
+            for kind, row in reader.history(args.loan_id):
+                print(json.dumps({kind: row}, default=str))
+        raise SystemExit(0 if loan is not None else 1)
+
+    if args.command == "run":
+        output = run(args.older_than_days, args.chunk_size, args.directory, args.as_of)
+    elif args.command == "partitions":
+        output = {"created": ensure_partitions(args.ahead)}
+    else:
+        output = status(args.directory)
+    print(json.dumps(output, indent=2, default=str))
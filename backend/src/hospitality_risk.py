@@ -0,0 +1,212 @@
+"""
+Risk scoring for hospitality property loans.
+
+A property's capacity to borrow is its net operating income (NOI) against
+the annual debt service of the requested loan. Revenue comes from
+``estimated_revenue`` or, when absent, rooms x average daily rate x
+occupancy. Each property's revenue is simulated under correlated occupancy
+and rate shocks (SIMULATION_PATHS paths of SIMULATION_YEARS years); the
+probability of default is the share of paths in which NOI falls short of
+debt service. The risk score blends that probability with leverage, track
+record and margin, and the offer is the largest amount the base-case NOI
+supports at TARGET_DSCR, capped at the request.
+
+The simulation is the CPU-heavy part, vectorized with NumPy over a batch of
+properties. score_properties() takes and returns plain tuples and dicts and
+never touches the app, so it can run in a process pool. The random stream
+is seeded from the inputs, so a property's score is reproducible and safe
+to cache.
+
+RiskScoreCache keeps one Redis entry per property_id holding the result
+and the fingerprint of the inputs it was computed from; a request with
+different inputs (or a new MODEL_VERSION) misses and overwrites the entry.
+Nothing needs invalidating: an entry is only ever served for the exact
+inputs it was computed from, and otherwise expires with its TTL.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = "2026-10"
+
+# Debt terms hospitality offers are priced at
+ANNUAL_RATE = 0.12
+TERM_MONTHS = 60
+TARGET_DSCR = 1.25
+
+# Defaults when the application leaves property data out
+DEFAULT_OPERATING_EXPENSE_RATIO = 0.65
+DEFAULT_OCCUPANCY = 0.6
+DEFAULT_YEARS_OPERATING = 0.0
+
+# Revenue simulation
+SIMULATION_PATHS = 4000
+SIMULATION_YEARS = 5
+OCCUPANCY_VOLATILITY = 0.12
+RATE_VOLATILITY = 0.08
+SHOCK_CORRELATION = 0.5
+
+# Fields of a scoring input tuple, in order
+INPUT_FIELDS = (
+    "requested_amount", "estimated_revenue", "rooms", "average_daily_rate", "occupancy_rate",
+    "operating_expenses", "existing_debt_service", "years_operating",
+)
+ScoringInput = Tuple[Optional[float], ...]
+
+
+def annual_debt_service(amounts) -> np.ndarray:
+    """Annual repayment of a fully amortizing loan at ANNUAL_RATE over TERM_MONTHS"""
+    monthly_rate = ANNUAL_RATE / 12
+    factor = monthly_rate / (1 - (1 + monthly_rate) ** -TERM_MONTHS)
+    return np.asarray(amounts, dtype=np.float64) * factor * 12
+
+
+def input_fingerprint(values: ScoringInput) -> str:
+    """Stable digest of the scoring inputs and model version"""
+    return hashlib.sha256(orjson.dumps([MODEL_VERSION, *values])).hexdigest()[:32]
+
+
+def _column(rows: Sequence[ScoringInput], index: int, default: float) -> np.ndarray:
+    return np.array([default if row[index] is None else row[index] for row in rows], dtype=np.float64)
+
+
+def score_properties(rows: Sequence[ScoringInput], paths: int = SIMULATION_PATHS) -> List[Dict[str, Any]]:
+    """Score a batch of properties; each row holds the INPUT_FIELDS values"""
+    if not rows:
+        return []
+
+    requested = _column(rows, 0, 0.0)
+    rooms = _column(rows, 2, 0.0)
+    daily_rate = _column(rows, 3, 0.0)
+    occupancy = np.clip(_column(rows, 4, DEFAULT_OCCUPANCY), 0.0, 1.0)
+    stated_revenue = _column(rows, 1, np.nan)
+    revenue = np.where(np.isnan(stated_revenue), rooms * daily_rate * occupancy * 365, stated_revenue)
+    stated_expenses = _column(rows, 5, np.nan)
+    expenses = np.where(np.isnan(stated_expenses), revenue * DEFAULT_OPERATING_EXPENSE_RATIO, stated_expenses)
+    existing_debt = _column(rows, 6, 0.0)
+    years_operating = _column(rows, 7, DEFAULT_YEARS_OPERATING)
+
+    debt_service = annual_debt_service(requested) + existing_debt
+    noi = revenue - expenses
+    dscr = np.divide(noi, debt_service, out=np.full_like(noi, np.inf), where=debt_service > 0)
+
+    # Correlated occupancy and rate shocks, as multiplicative revenue factors per simulated year.
+    # Each property draws from its own stream seeded by its inputs, so its score does not depend on the batch.
+    shocks = np.stack([
+        np.random.default_rng(int(input_fingerprint(tuple(row))[:16], 16)).standard_normal((2, paths, SIMULATION_YEARS))
+        for row in rows
+    ])
+    occupancy_shock = shocks[:, 0]
+    rate_shock = SHOCK_CORRELATION * occupancy_shock + np.sqrt(1 - SHOCK_CORRELATION ** 2) * shocks[:, 1]
+    revenue_factor = np.maximum(1 + OCCUPANCY_VOLATILITY * occupancy_shock, 0) * np.maximum(1 + RATE_VOLATILITY * rate_shock, 0)
+    # Fixed costs do not shrink with revenue; only the variable half of expenses does
+    variable_expenses = expenses * 0.5
+    fixed_expenses = expenses - variable_expenses
+    simulated_noi = (
+        revenue[:, None, None] * revenue_factor
+        - variable_expenses[:, None, None] * revenue_factor
+        - fixed_expenses[:, None, None]
+    )
+    shortfall = (simulated_noi < debt_service[:, None, None]).any(axis=2)
+    default_probability = shortfall.mean(axis=1)
+
+    leverage = np.divide(requested, revenue, out=np.full_like(requested, np.inf), where=revenue > 0)
+    margin = np.divide(noi, revenue, out=np.zeros_like(noi), where=revenue > 0)
+    logit = (
+        -1.5
+        + 4.0 * default_probability
+        + 0.8 * np.minimum(leverage, 5.0)
+        - 1.5 * np.clip(margin, -1.0, 1.0)
+        - 0.15 * np.minimum(years_operating, 10.0)
+    )
+    risk_score = 1 / (1 + np.exp(-logit))
+
+    supportable = np.maximum(noi / TARGET_DSCR - existing_debt, 0) / annual_debt_service(1.0)
+    offer = np.minimum(requested, supportable)
+
+    results = []
+    for index in range(len(rows)):
+        approved = risk_score[index] < 0.6 and offer[index] > 0
+        results.append({
+            "risk_score": round(float(risk_score[index]), 4),
+            "probability_of_default": round(float(default_probability[index]), 4),
+            "debt_service_coverage": round(float(dscr[index]), 3) if np.isfinite(dscr[index]) else None,
+            "estimated_revenue": round(float(revenue[index]), 2),
+            "estimated_offer": round(float(offer[index]), 2) if approved else 0.0,
+            "status": "offer_generated" if approved else "referred",
+            "model_version": MODEL_VERSION,
+        })
+    return results
+
+
+def risk_cache_key(property_id: str) -> str:
+    return f"hospitality:risk:{property_id}"
+
+
+class RiskScoreCache:
+    """Per-property cached scores, valid only for the inputs they were computed from"""
+
+    def __init__(self, ttl: int = 86400):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.errors = 0
+
+    async def get_many(self, redis_conn, requests: Sequence[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Cached results for (property_id, fingerprint) pairs; None where missing or computed from other inputs"""
+        if not requests:
+            return []
+        try:
+            stored = await redis_conn.mget([risk_cache_key(property_id) for property_id, _ in requests])
+        except Exception as e:
+            logger.error(f"Risk score cache read failed: {e}")
+            self.errors += 1
+            return [None] * len(requests)
+
+        results: List[Optional[Dict[str, Any]]] = []
+        for (_, fingerprint), value in zip(requests, stored):
+            entry = orjson.loads(value) if value else None
+            if entry is None:
+                self.misses += 1
+                results.append(None)
+            elif entry["fingerprint"] != fingerprint:
+                # Inputs changed since this score was computed
+                self.stale += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(entry["result"])
+        return results
+
+    async def set_many(self, redis_conn, entries: Sequence[Tuple[str, str, Dict[str, Any]]]) -> None:
+        if not entries:
+            return
+        try:
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                for property_id, fingerprint, result in entries:
+                    pipe.set(
+                        risk_cache_key(property_id),
+                        orjson.dumps({"fingerprint": fingerprint, "result": result}),
+                        ex=self.ttl,
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Risk score cache write failed: {e}")
+            self.errors += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
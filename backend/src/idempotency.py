@@ -0,0 +1,156 @@
+"""
+Redis-backed idempotency store for retried POST requests.
+
+The first request with a given key claims it with SET NX and runs; its
+response is stored under the key with a TTL. Later requests with the same key
+and body are answered from Redis without touching Postgres, and requests that
+arrive while the first is still running wait for its result instead of racing
+it.
+
+Each claim carries a random owner token and is renewed while its handler
+runs, so a slow request keeps its key. Completing or releasing a key is a
+compare-and-set on that claim: a worker whose claim expired (and was taken
+over) can't overwrite or delete the new owner's.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+# Each script acts only while KEYS[1] still holds the caller's claim (ARGV[1])
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, used to reject a key reused for a different request"""
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, redis_conn, ttl: int = 86400, lock_ttl: int = 30,
+                 wait_timeout: float = 10.0, poll_interval: float = 0.05):
+        self.redis = redis_conn
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def claim(fingerprint: str, owner: str) -> str:
+        return json.dumps({"state": "in_flight", "fingerprint": fingerprint, "owner": owner})
+
+    async def begin(self, key: str, claim: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim a key, or return the stored response of the request that already used it"""
+        deadline = time.monotonic() + self.wait_timeout
+        delay = self.poll_interval
+
+        while True:
+            # The claim expires on its own if the worker holding it dies mid-request
+            if await self.redis.set(key, claim, nx=True, ex=self.lock_ttl):
+                return None
+
+            raw = await self.redis.get(key)
+            if raw is None:
+                continue  # the holder released the key after a failure; try to claim it
+
+            record = json.loads(raw)
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Idempotency key was already used with a different request"
+                )
+            if record["state"] == "completed":
+                return record
+
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this idempotency key is still in progress"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def renew(self, key: str, claim: str) -> None:
+        """Extend the claim every third of lock_ttl until cancelled, while it is still ours"""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            if not await self.redis.eval(RENEW_SCRIPT, 1, key, claim, int(self.lock_ttl * 1000)):
+                return
+
+    async def complete(self, key: str, claim: str, fingerprint: str, status_code: int, body: Any) -> bool:
+        record = {"state": "completed", "fingerprint": fingerprint, "status_code": status_code, "body": body}
+        return bool(await self.redis.eval(COMPLETE_SCRIPT, 1, key, claim, json.dumps(record), self.ttl))
+
+    async def release(self, key: str, claim: str) -> bool:
+        return bool(await self.redis.eval(RELEASE_SCRIPT, 1, key, claim))
+
+    async def run(self, key: Optional[str], payload: Any, handler: Callable[[], Awaitable[Any]],
+                  response_model: Optional[Type[BaseModel]] = None) -> Any:
+        """Run ``handler`` once per key; duplicates replay the stored response.
+
+        Client errors (4xx) are stored and replayed like successes. Server errors
+        release the key so the client's retry gets a fresh attempt. When given,
+        ``response_model`` serializes the result for storage.
+        """
+        if key is None:
+            return await handler()
+
+        fingerprint = request_fingerprint(payload)
+        claim = self.claim(fingerprint, uuid.uuid4().hex)
+        record = await self.begin(key, claim, fingerprint)
+        if record is not None:
+            return JSONResponse(status_code=record["status_code"], content=record["body"],
+                                headers={"Idempotent-Replayed": "true"})
+
+        renewal = asyncio.create_task(self.renew(key, claim))
+        try:
+            result = await handler()
+            if response_model is not None:
+                body = response_model.model_validate(result).model_dump(mode="json")
+            else:
+                body = jsonable_encoder(result)
+        except HTTPException as e:
+            renewal.cancel()
+            if e.status_code >= 500:
+                await self.release(key, claim)
+                raise
+            await self.complete(key, claim, fingerprint, e.status_code, {"detail": e.detail})
+            raise
+        except BaseException:
+            renewal.cancel()
+            await self.release(key, claim)
+            raise
+
+        renewal.cancel()
+        await self.complete(key, claim, fingerprint, status.HTTP_200_OK, body)
+        return body
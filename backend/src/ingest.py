@@ -0,0 +1,208 @@
+"""
+Streaming parsers for payroll-deduction payment files.
+
+Employer partners send CSV (with a header row) or NDJSON files holding one
+payment per line. Records are parsed line by line from an async byte stream,
+so memory use does not depend on the size of the upload; a line longer than
+MAX_LINE_BYTES stops the parse with LineTooLong.
+
+Run as a CLI to ingest a local file through PaymentService:
+
+  python ingest.py payroll-2026-09.csv
+  python ingest.py payroll-2026-09.ndjson --format ndjson > rejected.ndjson
+"""
+
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# (line number, parsed record or None, parse error or None)
+ParsedLine = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+# Far beyond any real payroll or roster row; bounds what one unterminated line can buffer
+MAX_LINE_BYTES = 64 * 1024
+
+
+class LineTooLong(ValueError):
+    def __init__(self, line_number: int, limit: int):
+        super().__init__(f"line {line_number} is longer than {limit} bytes")
+        self.line_number = line_number
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Pick csv or ndjson from a Content-Type header or file extension"""
+    if content_type and content_type.split(";")[0].strip() in CSV_CONTENT_TYPES:
+        return "csv"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """Split an async byte stream into lines without buffering the whole body.
+
+    Only the unfinished line is carried between chunks, in a bytearray, so a line
+    spread over many chunks costs linear time. Raises LineTooLong past ``max_line_bytes``.
+    """
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) >= 0:
+            line_number += 1
+            if len(buffer) + end - start > max_line_bytes:
+                raise LineTooLong(line_number, max_line_bytes)
+            if buffer:
+                buffer += chunk[start:end]
+                yield bytes(buffer)
+                buffer.clear()
+            else:
+                yield chunk[start:end]
+            start = end + 1
+        buffer += chunk[start:]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(line_number + 1, max_line_bytes)
+    if buffer:
+        yield bytes(buffer)
+
+
+async def iter_records(chunks: AsyncIterator[bytes], file_format: str) -> AsyncIterator[ParsedLine]:
+    """Parse CSV or NDJSON records from a byte stream, one line at a time"""
+    header: Optional[List[str]] = None
+    line_number = 0
+
+    async for raw_line in iter_lines(chunks):
+        line_number += 1
+        line = raw_line.decode("utf-8-sig" if line_number == 1 else "utf-8", errors="replace").strip()
+        if not line:
+            continue
+
+        if file_format == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, None, f"expected {len(header)} columns, got {len(values)}"
+                continue
+            yield line_number, dict(zip(header, values)), None
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+async def chunked(records: AsyncIterator[Any], size: int) -> AsyncIterator[List[Any]]:
+    """Group an async iterator into lists of at most ``size`` items"""
+    chunk: List[Any] = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def optional_str(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def normalize_payment_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one payroll payment record; raises ValueError with the rejection reason"""
+    loan_id = str(record.get("loan_id") or "").strip()
+    if not loan_id:
+        raise ValueError("loan_id is required")
+
+    try:
+        amount = float(record.get("amount"))
+    except (TypeError, ValueError):
+        raise ValueError("amount must be a number")
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+
+    payment_date = record.get("payment_date")
+    if not payment_date:
+        raise ValueError("payment_date is required")
+    try:
+        payment_date = datetime.fromisoformat(str(payment_date).strip())
+    except ValueError:
+        raise ValueError("payment_date must be an ISO 8601 date")
+
+    return {
+        "loan_id": loan_id,
+        "user_id": optional_str(record.get("user_id")),
+        "amount": amount,
+        "payment_date": payment_date,
+        "payment_method": record.get("payment_method") or "payroll_deduction",
+        "reference_number": optional_str(record.get("reference_number")),
+    }
+
+
+def normalize_roster_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one employee roster record; raises ValueError with the rejection reason"""
+    employee_id = optional_str(record.get("employee_id"))
+    if not employee_id:
+        raise ValueError("employee_id is required")
+
+    try:
+        monthly_income = float(record.get("monthly_income"))
+        monthly_expenses = float(record.get("monthly_expenses") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("monthly_income and monthly_expenses must be numbers")
+    if monthly_income < 0 or monthly_expenses < 0:
+        raise ValueError("monthly_income and monthly_expenses must not be negative")
+
+    return {
+        "employee_id": employee_id,
+        "monthly_income": monthly_income,
+        "monthly_expenses": monthly_expenses,
+    }
+
+
+async def iter_handle(handle, block_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Read an open binary file in blocks"""
+    while True:
+        block = handle.read(block_size)
+        if not block:
+            break
+        yield block
+
+
+async def iter_file(path: str, block_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    with open(path, "rb") as handle:
+        async for block in iter_handle(handle, block_size):
+            yield block
+
+
+async def ingest_file(path: str, file_format: str) -> None:
+    """Ingest a local payroll file, printing rejections and the summary as NDJSON"""
+    from database import AsyncSessionLocal, dispose_engines
+    from main import PaymentService
+
+    async with AsyncSessionLocal() as db:
+        async for entry in PaymentService(db).ingest_payments(iter_records(iter_file(path), file_format)):
+            print(json.dumps(entry, default=str))
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Ingest a payroll-deduction payment file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    args = parser.parse_args()
+    asyncio.run(ingest_file(args.path, args.format or detect_format(None, args.path)))
@@ -0,0 +1,253 @@
+"""
+Loan balance ledger: snapshots, replay and adjustments.
+
+Every change to a loan's remaining balance is appended to ledger_entries in
+the same transaction as the change itself (disbursement on creation,
+payments, nightly accrual, manual adjustments), so the ledger is the audit
+trail and loans.remaining_balance is a projection of it.
+
+Per-loan snapshots in loan_balance_snapshots fold the ledger up to a
+sequence number; a loan's ledger balance is its snapshot plus the entries
+after it. Snapshots advance incrementally in sequence windows, each
+committed with a checkpoint. Entries younger than SNAPSHOT_LAG_SECONDS are
+left for the next run, so an entry whose transaction commits after a later
+sequence number is not skipped.
+
+Replay rebuilds every balance from the full ledger in one streaming pass,
+rewrites the snapshots and reports loans whose stored balance disagrees;
+with --repair the differences are posted as adjustment entries.
+
+  python ledger.py snapshot
+  python ledger.py replay [--repair]
+  python ledger.py adjust LOAN_ID -25.00 --memo "goodwill credit"
+"""
+
+import argparse
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import redis as redis_sync
+from sqlalchemy import func, insert, select, update
+
+from database import SessionLocal, get_engine
+from loan_cache import bump_versions
+from main import (
+    LEDGER_ADJUSTMENT, REDIS_URL, JobCheckpoint, LedgerEntry, Loan, LoanApplication, LoanBalanceSnapshot,
+    add_portfolio_delta, company_portfolio_upsert, ledger_entry, portfolio_delta_rows, upsert_insert,
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_JOB = "ledger:snapshots"
+SNAPSHOT_LAG_SECONDS = 60
+SNAPSHOT_WINDOW = 1_000_000
+REPLAY_CHUNK_SIZE = 10_000
+# Balances are compared to the cent
+BALANCE_TOLERANCE = 0.005
+
+
+def snapshot_upsert(accumulate: bool):
+    """Upsert snapshots, either adding a window of entries or replacing the balance outright"""
+    snapshots = LoanBalanceSnapshot.__table__
+    statement = upsert_insert(get_engine().dialect.name, snapshots)
+    if accumulate:
+        values = {
+            "balance": snapshots.c.balance + statement.excluded.balance,
+            "entry_count": snapshots.c.entry_count + statement.excluded.entry_count,
+        }
+    else:
+        values = {"balance": statement.excluded.balance, "entry_count": statement.excluded.entry_count}
+    return statement.on_conflict_do_update(
+        index_elements=[snapshots.c.loan_id],
+        set_={**values, "last_sequence": statement.excluded.last_sequence, "updated_at": datetime.utcnow()},
+    )
+
+
+def settled_sequence(db, after: int) -> int:
+    """Highest sequence old enough that no earlier sequence can still be uncommitted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=SNAPSHOT_LAG_SECONDS)
+    highest = db.scalar(
+        select(func.max(LedgerEntry.sequence)).where(LedgerEntry.sequence > after, LedgerEntry.created_at <= cutoff)
+    )
+    return highest or after
+
+
+def ledger_totals(low: int, high: int):
+    """Per-loan sum of entries with low < sequence <= high, in loan_id order"""
+    return (
+        select(
+            LedgerEntry.loan_id,
+            func.sum(LedgerEntry.amount).label("balance"),
+            func.count().label("entry_count"),
+            func.max(LedgerEntry.sequence).label("last_sequence"),
+        )
+        .where(LedgerEntry.sequence > low, LedgerEntry.sequence <= high)
+        .group_by(LedgerEntry.loan_id)
+        .order_by(LedgerEntry.loan_id)
+    )
+
+
+def fold_snapshots(window: int = SNAPSHOT_WINDOW) -> Dict[str, Any]:
+    """Advance every loan's snapshot over settled entries, one committed window at a time"""
+    started = time.perf_counter()
+    folded = 0
+    statement = snapshot_upsert(accumulate=True)
+
+    with SessionLocal() as db:
+        checkpoint = db.get(JobCheckpoint, SNAPSHOT_JOB)
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_name=SNAPSHOT_JOB, last_key="0", processed=0)
+            db.add(checkpoint)
+        low = int(checkpoint.last_key or 0)
+        target = settled_sequence(db, low)
+
+        while low < target:
+            high = min(low + window, target)
+            rows = [row._asdict() for row in db.execute(ledger_totals(low, high))]
+            if rows:
+                db.execute(statement, rows)
+            folded += sum(row["entry_count"] for row in rows)
+            checkpoint.last_key = str(high)
+            checkpoint.processed += len(rows)
+            db.commit()
+            low = high
+
+        checkpoint.completed_at = datetime.utcnow()
+        db.commit()
+
+    return {"entries_folded": folded, "last_sequence": low, "elapsed_seconds": time.perf_counter() - started}
+
+
+def replay(repair: bool = False, chunk_size: int = REPLAY_CHUNK_SIZE) -> Dict[str, Any]:
+    """Rebuild every loan's balance from the ledger and compare it with loans.remaining_balance"""
+    started = time.perf_counter()
+    loans_replayed = 0
+    mismatched: List[str] = []
+    statement = snapshot_upsert(accumulate=False)
+
+    with SessionLocal() as db:
+        checkpoint = db.get(JobCheckpoint, SNAPSHOT_JOB)
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_name=SNAPSHOT_JOB, processed=0)
+            db.add(checkpoint)
+        high = settled_sequence(db, 0)
+
+        totals = ledger_totals(0, high).subquery()
+        query = (
+            select(Loan.id, Loan.remaining_balance, totals.c.balance, totals.c.entry_count, totals.c.last_sequence)
+            .join(totals, totals.c.loan_id == Loan.id, isouter=True)
+            .order_by(Loan.id)
+        )
+
+        # Aggregation happens in the database; the result streams back through a server-side cursor
+        with get_engine().connect() as reader:
+            result = reader.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                snapshots = [
+                    {"loan_id": row.id, "balance": row.balance, "entry_count": row.entry_count,
+                     "last_sequence": row.last_sequence}
+                    for row in rows if row.entry_count
+                ]
+                if snapshots:
+                    db.execute(statement, snapshots)
+                db.commit()
+                loans_replayed += len(rows)
+                mismatched.extend(
+                    row.id for row in rows
+                    if abs((row.balance or 0) - row.remaining_balance) > BALANCE_TOLERANCE
+                )
+
+        checkpoint.last_key = str(high)
+        checkpoint.completed_at = datetime.utcnow()
+        db.commit()
+
+    # Entries after the replay's high-water mark can explain a difference; recheck each one under lock
+    repaired = [loan_id for loan_id in mismatched if repair_loan(loan_id, dry_run=not repair)]
+    return {
+        "loans_replayed": loans_replayed,
+        "last_sequence": high,
+        "mismatched": len(repaired),
+        "mismatched_loan_ids": repaired[:1000],
+        "repaired": repair,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+def repair_loan(loan_id: str, dry_run: bool = True) -> Optional[float]:
+    """Difference between a loan's stored and ledger balance, posted as an adjustment unless dry_run"""
+    with SessionLocal() as db:
+        stored = db.scalar(select(Loan.remaining_balance).where(Loan.id == loan_id).with_for_update())
+        if stored is None:
+            return None
+        ledger = db.scalar(select(func.coalesce(func.sum(LedgerEntry.amount), 0)).where(LedgerEntry.loan_id == loan_id))
+        difference = stored - ledger
+        if abs(difference) <= BALANCE_TOLERANCE:
+            return None
+        if not dry_run:
+            db.execute(insert(LedgerEntry), [ledger_entry(loan_id, LEDGER_ADJUSTMENT, difference, memo="replay repair")])
+            db.commit()
+        return difference
+
+
+def adjust(loan_id: str, amount: float, memo: Optional[str] = None) -> Dict[str, Any]:
+    """Change a loan's balance by ``amount`` (negative to credit), recording it in the ledger"""
+    with SessionLocal() as db:
+        loan = db.execute(
+            select(Loan.user_id, Loan.remaining_balance, Loan.status, LoanApplication.company_id)
+            .join(LoanApplication, LoanApplication.id == Loan.application_id, isouter=True)
+            .where(Loan.id == loan_id)
+            .with_for_update(of=Loan)
+        ).first()
+        if loan is None:
+            raise ValueError(f"Loan {loan_id} not found")
+
+        # Balances never go negative; the ledger records the change actually applied
+        remaining = max(loan.remaining_balance + amount, 0)
+        applied = remaining - loan.remaining_balance
+        loan_status = "completed" if remaining <= 0 else loan.status
+        db.execute(
+            update(Loan).where(Loan.id == loan_id).values(
+                remaining_balance=remaining, status=loan_status,
+                # Kept apart so the accrual job, which rebuilds remaining_balance, keeps the adjustment
+                adjustments_total=Loan.adjustments_total + applied,
+            )
+        )
+        db.execute(insert(LedgerEntry), [ledger_entry(loan_id, LEDGER_ADJUSTMENT, applied, memo=memo)])
+
+        deltas: Dict[str, Dict[str, float]] = {}
+        add_portfolio_delta(
+            deltas, loan.company_id,
+            outstanding_balance=applied,
+            delinquent_count=-1 if loan.status == "overdue" and loan_status == "completed" else 0,
+        )
+        if deltas:
+            db.execute(company_portfolio_upsert(get_engine().dialect.name), portfolio_delta_rows(deltas))
+        db.commit()
+
+    # The owner's cached listings and listing ETags must not outlive the change
+    bump_versions(redis_sync.Redis.from_url(REDIS_URL), [loan.user_id])
+    return {"loan_id": loan_id, "applied": applied, "remaining_balance": remaining, "status": loan_status}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loan balance ledger maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot", help="advance balance snapshots over new ledger entries")
+    replay_parser = commands.add_parser("replay", help="rebuild every balance from the full ledger")
+    replay_parser.add_argument("--repair", action="store_true", help="post adjustments for mismatched loans")
+    adjust_parser = commands.add_parser("adjust", help="post a manual balance adjustment")
+    adjust_parser.add_argument("loan_id")
+    adjust_parser.add_argument("amount", type=float)
+    adjust_parser.add_argument("--memo")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        output = fold_snapshots()
+    elif args.command == "replay":
+        output = replay(repair=args.repair)
+    else:
+        output = adjust(args.loan_id, args.amount, args.memo)
+    print(json.dumps(output, indent=2, default=str))
@@ -0,0 +1,214 @@
+"""
+Read-through Redis cache for per-user loan listings.
+
+Each user has a version counter (``loans:version:{user_id}``). Cached pages
+live in a hash keyed by that version, one field per query variant (status,
+cursor, limit). Writes invalidate by bumping the version, so a slow loader
+that read the old rows can only fill a hash nobody reads any more; stale
+hashes simply expire.
+
+Concurrent misses for the same page inside one worker share a single load
+(single-flight), so an expiry does not send a burst of identical queries to
+Postgres.
+
+The same version backs the listing's weak ETag: a client revalidating with
+If-None-Match is answered 304 after one Redis GET, without touching the
+cached pages or the loans table. So every write to a user's loans must bump
+their version (after commit), here or with bump_versions() in the batch
+jobs.
+
+Versions never repeat: a missing version key is seeded from the Redis clock
+(in microseconds) and a bump moves it to at least the current clock. So a
+version key can expire (VERSION_TTL_SECONDS), be lost with a Redis restart,
+or be deleted when a bump fails, and the next read just starts a version no
+client holds an ETag for.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSION_TTL_SECONDS = 86400
+
+# Version lookup (seeding a missing one from the clock) and page read in one round-trip
+READ_SCRIPT = """
+local version = redis.call('GET', KEYS[1])
+if not version then
+    local now = redis.call('TIME')
+    version = string.format('%.0f', now[1] * 1000000 + now[2])
+    redis.call('SET', KEYS[1], version, 'EX', ARGV[3])
+end
+return {version, redis.call('HGET', ARGV[1] .. version, ARGV[2])}
+"""
+
+# Move a version past both its current value and the clock, so it never returns to a value already handed out
+BUMP_SCRIPT = """
+local now = redis.call('TIME')
+local version = math.max(tonumber(redis.call('GET', KEYS[1]) or '0') + 1, now[1] * 1000000 + now[2])
+redis.call('SET', KEYS[1], string.format('%.0f', version), 'EX', ARGV[1])
+return 1
+"""
+
+
+def version_key(user_id: str) -> str:
+    return f"loans:version:{user_id}"
+
+
+def page_key_prefix(user_id: str) -> str:
+    return f"loans:pages:{user_id}:"
+
+
+def listing_etag(user_id: str, variant: str, version: str) -> str:
+    """Weak validator for one listing variant at one version of the user's loans"""
+    # Versions are per user, so the user is hashed in too: a shared device must not revalidate another account's copy
+    digest = hashlib.blake2b(f"{user_id}\x00{variant}".encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``, as If-None-Match requires"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def bump_versions(client, user_ids: Iterable[str]) -> None:
+    """Synchronous invalidation for the batch jobs (best effort; call after commit)"""
+    keys = [version_key(user_id) for user_id in set(user_ids)]
+    if not keys:
+        return
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.eval(BUMP_SCRIPT, 1, key, VERSION_TTL_SECONDS)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Loan cache invalidation failed: {e}")
+        try:
+            # Without its version key the next read seeds a fresh version, so no stale page or 304 survives
+            client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Loan cache version reset failed: {e}")
+
+
+class LoanListCache:
+    def __init__(self, ttl: int = 60):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.not_modified = 0
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    async def _read(self, redis_conn, user_id: str, variant: str) -> Tuple[str, bytes]:
+        version, body = await redis_conn.eval(
+            READ_SCRIPT, 1, version_key(user_id), page_key_prefix(user_id), variant, VERSION_TTL_SECONDS
+        )
+        return version.decode() if isinstance(version, bytes) else str(version), body
+
+    async def _store(self, redis_conn, user_id: str, version: str, variant: str, body: bytes) -> None:
+        key = page_key_prefix(user_id) + version
+        async with redis_conn.pipeline(transaction=False) as pipe:
+            pipe.hset(key, variant, body)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def revalidate(self, redis_conn, user_id: str, variant: str, if_none_match: str) -> Optional[str]:
+        """The current ETag when the client already holds it (answer 304), else None"""
+        try:
+            version = await redis_conn.get(version_key(user_id))
+        except Exception as e:
+            logger.error(f"Loan cache version read failed: {e}")
+            self.errors += 1
+            return None
+        if version is None:
+            return None  # expired or reset: the next read starts a version the client can't hold
+        etag = listing_etag(user_id, variant, version.decode())
+        if not etag_matches(if_none_match, etag):
+            return None
+        self.not_modified += 1
+        return etag
+
+    async def get_or_load(self, redis_conn, user_id: str, variant: str,
+                          loader: Callable[[], Awaitable[bytes]]) -> Tuple[Optional[str], bytes]:
+        """The page for ``variant`` and its ETag, loading and storing the page on a miss.
+
+        The ETag carries the version read before any load, so a write racing the load can only make
+        the client fetch again, never pin it to stale rows. It is None when Redis could not be read.
+        """
+        try:
+            version, body = await self._read(redis_conn, user_id, variant)
+        except Exception as e:
+            # A Redis outage degrades to uncached reads rather than failing the request
+            logger.error(f"Loan cache read failed: {e}")
+            self.errors += 1
+            return None, await loader()
+
+        etag = listing_etag(user_id, variant, version)
+        if body is not None:
+            self.hits += 1
+            return etag, body
+
+        flight_key = (user_id, version, variant)
+        pending = self._inflight.get(flight_key)
+        if pending is not None:
+            self.collapsed += 1
+            return etag, await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            body = await loader()
+            future.set_result(body)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[flight_key]
+
+        try:
+            await self._store(redis_conn, user_id, version, variant, body)
+        except Exception as e:
+            logger.error(f"Loan cache write failed: {e}")
+            self.errors += 1
+        return etag, body
+
+    async def invalidate(self, redis_conn, *user_ids: str) -> None:
+        """Bump each user's version so every cached page and ETag for them is bypassed"""
+        keys = [version_key(user_id) for user_id in set(user_ids)]
+        if not keys:
+            return
+        try:
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.eval(BUMP_SCRIPT, 1, key, VERSION_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Loan cache invalidation failed: {e}")
+            self.errors += 1
+            try:
+                # Without its version key the next read seeds a fresh version, so no stale page or 304 survives
+                await redis_conn.delete(*keys)
+            except Exception as e:
+                logger.error(f"Loan cache version reset failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.collapsed
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,361 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+A deliberately small subset of the Prometheus client model (counters,
+gauges, histograms with fixed label names, and gauges computed at scrape
+time), kept dependency-free and cheap on the hot path: recording a sample
+is a dict lookup, a bisect and two additions under an uncontended lock.
+
+Metrics are per process. With several uvicorn workers each process serves
+its own /metrics, so scrape the workers individually (or run one worker
+per container) and aggregate in Prometheus.
+
+Also here are the hooks that feed the built-in metrics: an ASGI middleware
+for request latency and in-flight requests, SQLAlchemy engine events for
+query timing, a timed pool class for connection checkout wait, and scrape
+time pool size gauges.
+"""
+
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; spans a sub-millisecond cache hit to a multi-second bulk request
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labelvalues: str) -> None:
+        self.inc(-amount, *labelvalues)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class CallbackGauge(Metric):
+    """Gauge whose samples are read from a callback when scraped"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.callback()
+        ]
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labelvalues", "started")
+
+    def __init__(self, histogram: "Histogram", labelvalues: LabelValues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (the last one is +Inf), then the sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def time(self, *labelvalues: str) -> _HistogramTimer:
+        """Context manager observing the elapsed time of its block"""
+        return _HistogramTimer(self, labelvalues)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback_gauge(self, *args, **kwargs) -> CallbackGauge:
+        return self.register(CallbackGauge(*args, **kwargs))
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)
+)
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine", "operation"), buckets=QUERY_BUCKETS
+)
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",), buckets=QUERY_BUCKETS
+)
+REDIS_COMMAND_DURATION = registry.histogram(
+    "redis_command_duration_seconds", "Redis round-trip latency on the request path", ("operation",),
+    buckets=QUERY_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request latency per route template and in-flight requests per method"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(1.0, method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(1.0, method)
+            # The router records the matched route in the (shared) scope; templates keep cardinality bounded
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started, method, getattr(route, "path", "unmatched"), str(response_status[0])
+            )
+
+
+KNOWN_OPERATIONS = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "WITH"))
+
+
+def instrument_engine(sync_engine, label: str) -> None:
+    """Time every statement executed through ``sync_engine`` (pass AsyncEngine.sync_engine for async engines)"""
+    if hasattr(sync_engine.pool, "metrics_label"):
+        sync_engine.pool.metrics_label = label
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is None:
+            return
+        operation = statement.lstrip()[:8].split(None, 1)[0].upper() if statement else "OTHER"
+        DB_QUERY_DURATION.observe(
+            time.perf_counter() - started, label, operation if operation in KNOWN_OPERATIONS else "OTHER"
+        )
+
+
+# Weight of each new checkout in the recent-wait average, and its half-life without checkouts
+CHECKOUT_WAIT_SMOOTHING = 0.2
+CHECKOUT_WAIT_HALF_LIFE = 1.0
+
+
+def timed_pool_class(base):
+    """Pool subclass recording how long each checkout waited (pool.recreate() keeps the class)
+
+    Besides the histogram, each pool keeps a decaying average of recent waits and
+    the start times of checkouts still waiting, read by checkout_pressure().
+    """
+
+    class TimedPool(base):
+        metrics_label = "default"
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._wait_lock = threading.Lock()
+            self._waiting: Dict[int, float] = {}
+            self._wait_keys = itertools.count()
+            self._recent_wait = 0.0
+            self._recent_wait_at = time.perf_counter()
+
+        def connect(self):
+            started = time.perf_counter()
+            key = next(self._wait_keys)
+            with self._wait_lock:
+                self._waiting[key] = started
+            try:
+                return super().connect()
+            finally:
+                finished = time.perf_counter()
+                waited = finished - started
+                with self._wait_lock:
+                    del self._waiting[key]
+                    self._recent_wait = self._decayed_wait(finished) * (1 - CHECKOUT_WAIT_SMOOTHING) + \
+                        waited * CHECKOUT_WAIT_SMOOTHING
+                    self._recent_wait_at = finished
+                DB_POOL_CHECKOUT_WAIT.observe(waited, self.metrics_label)
+
+        def _decayed_wait(self, now: float) -> float:
+            return self._recent_wait * 0.5 ** ((now - self._recent_wait_at) / CHECKOUT_WAIT_HALF_LIFE)
+
+        def checkout_pressure(self) -> float:
+            """Seconds: the recent average checkout wait, or the longest wait still in progress if longer"""
+            now = time.perf_counter()
+            with self._wait_lock:
+                oldest = min(self._waiting.values(), default=now)
+                return max(self._decayed_wait(now), now - oldest)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = timed_pool_class(QueuePool)
+TimedAsyncAdaptedQueuePool = timed_pool_class(AsyncAdaptedQueuePool)
+
+
+def register_pool_gauges(engines: Callable[[], Dict[str, object]]) -> None:
+    """Pool size, checked-out and overflow connections per engine, read at scrape time
+
+    ``engines`` returns {label: sync engine}; pools without the statistic (SQLite's) are skipped.
+    """
+
+    def samples(method: str):
+        def collect():
+            for label, sync_engine in engines().items():
+                value = getattr(sync_engine.pool, method, None)
+                if callable(value):
+                    # QueuePool counts overflow from -pool_size until the pool has filled
+                    yield (label,), max(value(), 0)
+        return collect
+
+    registry.callback_gauge("db_pool_size", "Configured pool size", ("engine",), samples("size"))
+    registry.callback_gauge("db_pool_checked_out", "Connections currently checked out", ("engine",), samples("checkedout"))
+    registry.callback_gauge("db_pool_overflow", "Connections open beyond pool_size", ("engine",), samples("overflow"))
@@ -0,0 +1,143 @@
+"""
+Versioned schema migrations.
+
+Migrations live in migrations/ as ``NNNN_description.py`` modules (see its
+package docstring) and are applied in version order. Each one runs in its
+own transaction together with the row recording it in schema_migrations,
+so a failed migration leaves nothing half-recorded and the next run picks
+up where it stopped.
+
+Run this once per deploy, before the new API workers start; workers never
+touch the schema themselves. On Postgres the run holds an advisory lock,
+so two deploys (or RUN_MIGRATIONS_ON_STARTUP workers) racing each other
+apply every migration exactly once; the others wait, then find nothing
+left to do.
+
+  python migrate.py                 # apply everything pending
+  python migrate.py upgrade --to 0001
+  python migrate.py status
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import pkgutil
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+import migrations
+from database import get_engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_(\w+)$")
+# pg_advisory_lock key shared by every migration run against a database
+ADVISORY_LOCK_KEY = 0x42554646524C  # "BUFFRL"
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    module: str
+
+
+def discover() -> List[Migration]:
+    """Every migration module, in version order"""
+    found = []
+    for module in pkgutil.iter_modules(migrations.__path__):
+        match = MIGRATION_NAME.match(module.name)
+        if match is None:
+            continue
+        found.append(Migration(match.group(1), match.group(2), f"{migrations.__name__}.{module.name}"))
+    found.sort()
+    versions = [migration.version for migration in found]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return found
+
+
+@contextmanager
+def migration_lock(connection: Connection) -> Iterator[None]:
+    """Serialize migration runs against the same database (Postgres only; SQLite has one writer anyway)"""
+    if connection.dialect.name != "postgresql":
+        yield
+        return
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    connection.commit()
+    try:
+        yield
+    finally:
+        connection.rollback()
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        connection.commit()
+
+
+def applied_versions(connection: Connection) -> Dict[str, datetime]:
+    schema_migrations.create(connection, checkfirst=True)
+    versions = dict(connection.execute(select(schema_migrations.c.version, schema_migrations.c.applied_at)).all())
+    connection.commit()
+    return versions
+
+
+def upgrade(engine: Optional[Engine] = None, target: Optional[str] = None) -> List[str]:
+    """Apply pending migrations up to and including ``target`` (default: all); returns the versions applied"""
+    engine = engine or get_engine()
+    applied = []
+    with engine.connect() as connection, migration_lock(connection):
+        done = applied_versions(connection)
+        for migration in discover():
+            if target is not None and migration.version > target:
+                break
+            if migration.version in done:
+                continue
+            started = time.perf_counter()
+            with connection.begin():
+                importlib.import_module(migration.module).upgrade(connection)
+                connection.execute(insert(schema_migrations).values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow(),
+                ))
+            logger.info(f"Applied migration {migration.version}_{migration.name} "
+                        f"in {time.perf_counter() - started:.2f}s")
+            applied.append(migration.version)
+    return applied
+
+
+def status(engine: Optional[Engine] = None) -> List[Dict[str, Any]]:
+    """Every known migration and when it was applied (None while pending)"""
+    engine = engine or get_engine()
+    with engine.connect() as connection:
+        done = applied_versions(connection)
+    return [
+        {"version": migration.version, "name": migration.name, "applied_at": done.get(migration.version)}
+        for migration in discover()
+    ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Versioned schema migrations")
+    commands = parser.add_subparsers(dest="command")
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations (the default)")
+    upgrade_parser.add_argument("--to", help="stop after this version")
+    commands.add_parser("status", help="list migrations and when each was applied")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        output = status()
+    else:
+        output = {"applied": upgrade(target=getattr(args, "to", None))}
+    print(json.dumps(output, indent=2, default=str))
@@ -0,0 +1,139 @@
+"""
+Baseline: the schema the API used to create with metadata.create_all on
+every startup. Each table and index is created only if missing, so
+databases that already have them just get the version recorded. Indexes
+are created one by one: create_all skips a table that exists, and with it
+any index added to the model after that table was first created.
+"""
+
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, text,
+)
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "loan_applications", metadata,
+    Column("id", String, primary_key=True),
+    Column("application_id", String, unique=True, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("company_id", String, nullable=False),
+    Column("employee_verification_id", String, nullable=False),
+    Column("loan_amount", Float, nullable=False),
+    Column("loan_term", Integer, nullable=False),
+    Column("loan_purpose", Text),
+    Column("monthly_income", Float),
+    Column("monthly_expenses", Float),
+    Column("employment_info", JSON),
+    Column("status", String),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_loan_applications_company_id", "company_id"),
+)
+
+Table(
+    "loans", metadata,
+    Column("id", String, primary_key=True),
+    Column("application_id", String, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("term_months", Integer, nullable=False),
+    Column("interest_rate", Float, nullable=False),
+    Column("monthly_payment", Float, nullable=False),
+    Column("total_amount", Float, nullable=False),
+    Column("status", String),
+    Column("disbursement_date", DateTime),
+    Column("maturity_date", DateTime),
+    Column("next_payment_date", DateTime),
+    Column("principal_balance", Float, nullable=False),
+    Column("interest_balance", Float),
+    Column("total_paid", Float),
+    Column("remaining_balance", Float, nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_loans_user_id_status", "user_id", "status"),
+    Index("ix_loans_user_id_created_at_id", "user_id", "created_at", "id"),
+)
+
+Table(
+    "payments", metadata,
+    Column("id", String, primary_key=True),
+    Column("loan_id", String, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("payment_date", DateTime, nullable=False),
+    Column("payment_method", String),
+    Column("reference_number", String, index=True),
+    Column("status", String),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_payments_loan_id_payment_date", "loan_id", "payment_date"),
+)
+
+Table(
+    "job_checkpoints", metadata,
+    Column("job_name", String, primary_key=True),
+    Column("last_key", String),
+    Column("processed", Integer, nullable=False),
+    Column("completed_at", DateTime),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "company_portfolios", metadata,
+    Column("company_id", String, primary_key=True),
+    Column("loan_count", Integer, nullable=False),
+    Column("total_disbursed", Float, nullable=False),
+    Column("total_paid", Float, nullable=False),
+    Column("outstanding_balance", Float, nullable=False),
+    Column("delinquent_count", Integer, nullable=False),
+    Column("reconciled_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "ledger_entries", metadata,
+    Column("sequence", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("loan_id", String, nullable=False),
+    Column("entry_type", String, nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("payment_id", String),
+    Column("memo", Text),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_ledger_entries_loan_id_sequence", "loan_id", "sequence"),
+)
+
+Table(
+    "loan_balance_snapshots", metadata,
+    Column("loan_id", String, primary_key=True),
+    Column("balance", Float, nullable=False),
+    Column("last_sequence", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+    Column("entry_count", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "outbox_events", metadata,
+    Column("id", String, primary_key=True),
+    Column("event_type", String, nullable=False),
+    Column("aggregate_id", String, nullable=False),
+    Column("payload", JSON, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text),
+    Column("available_at", DateTime, nullable=False),
+    Column("published_at", DateTime),
+    Column("created_at", DateTime, nullable=False),
+    Index(
+        "ix_outbox_events_unpublished", "available_at",
+        postgresql_where=text("published_at IS NULL"), sqlite_where=text("published_at IS NULL"),
+    ),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    metadata.create_all(connection, checkfirst=True)
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
@@ -0,0 +1,69 @@
+"""
+Payments partitioned by month of payment_date (Postgres).
+
+The existing table is renamed aside, a range-partitioned payments table
+takes its place with one partition per month from the oldest payment to
+PARTITION_MONTHS_AHEAD months past today, plus a default partition for
+anything outside them, and the rows are copied across. Postgres requires
+the partition key in every unique constraint, so the primary key becomes
+(id, payment_date); ids are still UUIDs generated per payment.
+
+Later months are added ahead of time by ``python archive.py partitions``.
+SQLite has no table partitioning, so there this migration only records
+its version.
+"""
+
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARTITION_MONTHS_AHEAD = 3
+
+COLUMNS = "id, loan_id, user_id, amount, payment_date, payment_method, reference_number, status, created_at, updated_at"
+
+
+def month_start(day: date, months: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade(connection: Connection) -> None:
+    if connection.dialect.name != "postgresql":
+        return
+
+    # The old table keeps its index names (payments_pkey included) until it is dropped below
+    connection.execute(text("ALTER TABLE payments RENAME TO payments_unpartitioned"))
+    connection.execute(text("""
+        CREATE TABLE payments (
+            id VARCHAR NOT NULL,
+            loan_id VARCHAR NOT NULL,
+            user_id VARCHAR NOT NULL,
+            amount FLOAT NOT NULL,
+            payment_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            payment_method VARCHAR,
+            reference_number VARCHAR,
+            status VARCHAR,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT payments_partitioned_pkey PRIMARY KEY (id, payment_date)
+        ) PARTITION BY RANGE (payment_date)
+    """))
+    connection.execute(text("CREATE TABLE payments_default PARTITION OF payments DEFAULT"))
+
+    oldest = connection.execute(text("SELECT min(payment_date) FROM payments_unpartitioned")).scalar()
+    month = month_start(oldest.date() if oldest else date.today())
+    last = month_start(date.today(), PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        following = month_start(month, 1)
+        connection.execute(text(
+            f"CREATE TABLE payments_{month:%Y_%m} PARTITION OF payments "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        ))
+        month = following
+
+    connection.execute(text(f"INSERT INTO payments ({COLUMNS}) SELECT {COLUMNS} FROM payments_unpartitioned"))
+    # Dropping the old table frees its index names for the partitioned indexes
+    connection.execute(text("DROP TABLE payments_unpartitioned"))
+    connection.execute(text("CREATE INDEX ix_payments_loan_id_payment_date ON payments (loan_id, payment_date)"))
+    connection.execute(text("CREATE INDEX ix_payments_reference_number ON payments (reference_number)"))
@@ -0,0 +1,27 @@
+"""
+Indexes the first release of 0001_baseline missed on databases whose tables
+predate them: it created missing tables, but not missing indexes on tables
+that already existed. Databases that recorded that version without the
+indexes get them here; everywhere else each statement is a no-op.
+
+On Postgres the payments indexes already exist on the partitioned table
+(0002 creates them) and IF NOT EXISTS leaves them alone.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+INDEXES = (
+    "ix_loan_applications_company_id ON loan_applications (company_id)",
+    "ix_loans_user_id_status ON loans (user_id, status)",
+    "ix_loans_user_id_created_at_id ON loans (user_id, created_at, id)",
+    "ix_payments_loan_id_payment_date ON payments (loan_id, payment_date)",
+    "ix_payments_reference_number ON payments (reference_number)",
+    "ix_ledger_entries_loan_id_sequence ON ledger_entries (loan_id, sequence)",
+    "ix_outbox_events_unpublished ON outbox_events (available_at) WHERE published_at IS NULL",
+)
+
+
+def upgrade(connection: Connection) -> None:
+    for index in INDEXES:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {index}"))
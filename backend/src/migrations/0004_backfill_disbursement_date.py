@@ -0,0 +1,18 @@
+"""
+Disbursement dates for loans disbursed before they were recorded.
+
+Loans that had already left "pending" were paid out, but disbursement_date
+was never set, so the accrual job, which only picks up disbursed loans,
+skipped them. They take their creation time; maturity and next payment
+dates are left to the next accrual run, which derives them from the
+disbursement date. Pending loans get their date when they are disbursed.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "UPDATE loans SET disbursement_date = created_at WHERE disbursement_date IS NULL AND status != 'pending'"
+    ))
@@ -0,0 +1,25 @@
+"""
+Running total of manual balance adjustments on each loan.
+
+The accrual job rebuilds remaining_balance from principal, accrued interest
+and total_paid, so an adjustment that only changed remaining_balance was
+undone by the next run. Adjustments now also accumulate in
+adjustments_total, which accrual adds back. Existing loans take the sum of
+their adjustment entries; "replay repair" entries only bring the ledger in
+line with the stored balance, so they are left out.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("ALTER TABLE loans ADD COLUMN adjustments_total FLOAT NOT NULL DEFAULT 0"))
+    connection.execute(text("""
+        UPDATE loans SET adjustments_total = (
+            SELECT coalesce(sum(amount), 0) FROM ledger_entries
+            WHERE ledger_entries.loan_id = loans.id
+              AND entry_type = 'adjustment' AND coalesce(memo, '') != 'replay repair'
+        )
+        WHERE id IN (SELECT loan_id FROM ledger_entries WHERE entry_type = 'adjustment')
+    """))
@@ -0,0 +1,27 @@
+"""
+Lifetime totals of archived loans, per company.
+
+company_portfolios' loan_count, total_disbursed and total_paid cover every
+loan a company has had, but archival moves closed loans out of the tables
+reconcile.py scans. archived_portfolios keeps what archival moved, so
+reconciliation can add it back instead of taking the archived loans out of
+the lifetime totals.
+"""
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "archived_portfolios", metadata,
+    Column("company_id", String, primary_key=True),
+    Column("loan_count", Integer, nullable=False),
+    Column("total_disbursed", Float, nullable=False),
+    Column("total_paid", Float, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,9 @@
+"""
+Versioned schema migrations, applied in order by migrate.py.
+
+Each module is named ``NNNN_description.py`` and defines
+``upgrade(connection)``, which runs inside the transaction that records its
+version. A migration describes the schema as of its own revision: it must
+not import the models from main, which move on after it is written. Any
+change to the models needs a new migration next to them.
+"""
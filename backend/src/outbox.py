@@ -0,0 +1,395 @@
+"""
+Transactional outbox relay and Redis Stream consumers.
+
+Loan creation and payments write their follow-up events to outbox_events in
+the same transaction as the change, so a request only pays for the core
+write and no event is lost or published for a rolled-back change.
+
+The relay drains the outbox into the ``outbox:events`` Redis Stream. Each
+pass claims a batch of due rows with SELECT ... FOR UPDATE SKIP LOCKED (so
+any number of relays can run side by side), publishes them with one
+pipelined round-trip and marks them published. A failed batch is retried
+with exponential backoff. Delivery is at least once: a relay that dies
+between XADD and commit re-publishes the batch, so consumers deduplicate on
+the ``event_id`` field.
+
+Consumers read the stream through consumer groups: every group sees every
+event, and the consumers inside a group share the work. A message whose
+handler fails stays pending and is reclaimed (XAUTOCLAIM) after
+CLAIM_IDLE_MS; after MAX_DELIVERIES attempts it is moved to the
+dead-letter stream and acknowledged.
+
+Published rows are only kept for OUTBOX_RETENTION_DAYS (the stream and
+its consumers have long since moved past them): every relay deletes older
+ones every PURGE_INTERVAL_SECONDS, in batches of PURGE_BATCH_SIZE so no
+single statement holds locks for long.
+
+Relays and consumers publish their counters to ``outbox:metrics`` every
+METRICS_INTERVAL_SECONDS; collect_metrics() adds relay lag (age of the
+oldest unpublished event) and per-group stream lag and pending counts.
+
+  python outbox.py relay
+  python outbox.py consume notifications --consumer worker-1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+import redis.asyncio as redis
+from sqlalchemy import delete, func, select, update
+
+from database import AsyncSessionLocal
+from main import REDIS_URL, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "outbox:events"
+DEAD_LETTER_KEY = "outbox:events:dead"
+METRICS_KEY = "outbox:metrics"
+# Approximate cap on stream length; consumers are expected to keep up well within it
+STREAM_MAX_LENGTH = int(os.getenv("OUTBOX_STREAM_MAX_LENGTH", "1000000"))
+RELAY_BATCH_SIZE = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", "500"))
+RELAY_IDLE_SECONDS = 0.5
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 300.0
+CONSUMER_BATCH_SIZE = int(os.getenv("OUTBOX_CONSUMER_BATCH_SIZE", "100"))
+CONSUMER_BLOCK_MS = 2000
+CLAIM_IDLE_MS = 60000
+MAX_DELIVERIES = 5
+METRICS_INTERVAL_SECONDS = 10.0
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+PURGE_BATCH_SIZE = 5000
+PURGE_INTERVAL_SECONDS = 3600.0
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class WorkerMetrics:
+    """Counters for one relay or consumer process, with throughput over the last interval"""
+
+    def __init__(self, role: str, name: str):
+        self.role = role
+        self.name = name
+        self.counters: Dict[str, int] = {}
+        self.started = time.monotonic()
+        self._window_start = self.started
+        self._window_count = 0
+        self.throughput = 0.0
+
+    def add(self, counter: str, value: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def processed(self, count: int) -> None:
+        self.add("processed", count)
+        self._window_count += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed > 0:
+            self.throughput = self._window_count / elapsed
+        self._window_start = now
+        self._window_count = 0
+        return {
+            "role": self.role,
+            "name": self.name,
+            **self.counters,
+            "throughput_per_second": round(self.throughput, 2),
+            "uptime_seconds": round(now - self.started, 1),
+            "reported_at": datetime.utcnow().isoformat(),
+        }
+
+    async def publish(self, redis_conn) -> None:
+        try:
+            await redis_conn.hset(METRICS_KEY, f"{self.role}:{self.name}", orjson.dumps(self.snapshot()))
+        except Exception as e:
+            logger.error(f"Outbox metrics publish failed: {e}")
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def stream_fields(event: OutboxEvent) -> Dict[str, bytes]:
+    return {
+        "event_id": event.id,
+        "event_type": event.event_type,
+        "aggregate_id": event.aggregate_id,
+        "payload": orjson.dumps(event.payload),
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+async def purge_published(retention_days: float = OUTBOX_RETENTION_DAYS,
+                          batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Delete events published more than ``retention_days`` ago; returns how many were deleted"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = (
+                select(OutboxEvent.id)
+                .where(OutboxEvent.published_at < cutoff)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(batch)))
+            await db.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+
+
+class OutboxRelay:
+    def __init__(self, redis_conn, batch_size: int = RELAY_BATCH_SIZE, name: Optional[str] = None):
+        self.redis = redis_conn
+        self.batch_size = batch_size
+        self.metrics = WorkerMetrics("relay", name or f"{socket.gethostname()}:{os.getpid()}")
+
+    async def relay_batch(self) -> int:
+        """Publish one batch of due events; returns how many were published"""
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            result = await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.published_at.is_(None), OutboxEvent.available_at <= now)
+                .order_by(OutboxEvent.available_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for event in events:
+                        pipe.xadd(STREAM_KEY, stream_fields(event), maxlen=STREAM_MAX_LENGTH, approximate=True)
+                    await pipe.execute()
+            except Exception as e:
+                logger.error(f"Outbox relay publish failed: {e}")
+                self.metrics.add("publish_failures")
+                for event in events:
+                    event.attempts += 1
+                    event.last_error = str(e)[:1000]
+                    event.available_at = now + timedelta(seconds=retry_delay(event.attempts))
+                await db.commit()
+                return 0
+
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_([event.id for event in events]))
+                .values(published_at=datetime.utcnow())
+            )
+            await db.commit()
+            self.metrics.processed(len(events))
+            self.metrics.add("batches")
+            self.metrics.add("publish_ms", int((time.perf_counter() - started) * 1000))
+            return len(events)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        next_report = next_purge = time.monotonic()
+        while not stop.is_set():
+            try:
+                published = await self.relay_batch()
+                if time.monotonic() >= next_purge:
+                    self.metrics.add("purged", await purge_published())
+                    next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}")
+                self.metrics.add("errors")
+                published = 0
+            if time.monotonic() >= next_report:
+                await self.metrics.publish(self.redis)
+                next_report = time.monotonic() + METRICS_INTERVAL_SECONDS
+            # A full batch means there is more waiting; otherwise poll again shortly
+            if published < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=RELAY_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        await self.metrics.publish(self.redis)
+
+
+def decode_message(fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+    event = {key.decode(): value.decode() for key, value in fields.items()}
+    event["payload"] = orjson.loads(event["payload"])
+    return event
+
+
+class OutboxConsumer:
+    """One member of a consumer group, dispatching events to handlers by event_type"""
+
+    def __init__(self, redis_conn, group: str, consumer: str, handlers: Dict[str, Handler],
+                 batch_size: int = CONSUMER_BATCH_SIZE):
+        self.redis = redis_conn
+        self.group = group
+        self.consumer = consumer
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.metrics = WorkerMetrics(f"consumer:{group}", consumer)
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(STREAM_KEY, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def handle(self, messages: List) -> None:
+        acked = []
+        for message_id, fields in messages:
+            event = decode_message(fields)
+            handler = self.handlers.get(event["event_type"])
+            try:
+                if handler is not None:
+                    await handler(event)
+            except Exception as e:
+                # Left pending; reclaimed after CLAIM_IDLE_MS and retried
+                logger.error(f"Handler for {event['event_type']} failed on {event['event_id']}: {e}")
+                self.metrics.add("handler_failures")
+                continue
+            acked.append(message_id)
+        if acked:
+            await self.redis.xack(STREAM_KEY, self.group, *acked)
+            self.metrics.processed(len(acked))
+
+    async def reclaim(self) -> None:
+        """Take over messages idle past CLAIM_IDLE_MS, dead-lettering those out of attempts"""
+        _, messages, _ = await self.redis.xautoclaim(
+            STREAM_KEY, self.group, self.consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=self.batch_size
+        )
+        if not messages:
+            return
+
+        pending = await self.redis.xpending_range(
+            STREAM_KEY, self.group, min=messages[0][0], max=messages[-1][0], count=len(messages),
+            consumername=self.consumer,
+        )
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+        retry = []
+        for message_id, fields in messages:
+            if deliveries.get(message_id, 0) > MAX_DELIVERIES:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.xadd(DEAD_LETTER_KEY, {**fields, b"group": self.group}, maxlen=STREAM_MAX_LENGTH, approximate=True)
+                    pipe.xack(STREAM_KEY, self.group, message_id)
+                    await pipe.execute()
+                self.metrics.add("dead_lettered")
+            else:
+                retry.append((message_id, fields))
+        self.metrics.add("retried", len(retry))
+        await self.handle(retry)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        await self.ensure_group()
+        next_report = next_reclaim = time.monotonic()
+        while not stop.is_set():
+            try:
+                if time.monotonic() >= next_reclaim:
+                    await self.reclaim()
+                    next_reclaim = time.monotonic() + CLAIM_IDLE_MS / 1000 / 2
+                response = await self.redis.xreadgroup(
+                    self.group, self.consumer, {STREAM_KEY: ">"}, count=self.batch_size, block=CONSUMER_BLOCK_MS
+                )
+                for _, messages in response or []:
+                    await self.handle(messages)
+            except Exception as e:
+                logger.error(f"Outbox consumer error: {e}")
+                self.metrics.add("errors")
+                await asyncio.sleep(1)
+            if time.monotonic() >= next_report:
+                await self.metrics.publish(self.redis)
+                next_report = time.monotonic() + METRICS_INTERVAL_SECONDS
+        await self.metrics.publish(self.redis)
+
+
+async def collect_metrics(redis_conn) -> Dict[str, Any]:
+    """Relay lag from the outbox table, group lag from the stream, and every worker's last report"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(func.count(), func.min(OutboxEvent.created_at)).where(OutboxEvent.published_at.is_(None))
+        )
+        unpublished, oldest = result.one()
+
+    groups = []
+    try:
+        for group in await redis_conn.xinfo_groups(STREAM_KEY):
+            groups.append({
+                "name": group["name"].decode() if isinstance(group["name"], bytes) else group["name"],
+                "pending": group["pending"],
+                "lag": group.get("lag"),
+                "consumers": group["consumers"],
+            })
+    except redis.ResponseError:
+        pass  # Stream not created yet
+
+    workers = await redis_conn.hgetall(METRICS_KEY)
+    return {
+        "outbox": {
+            "unpublished": unpublished,
+            "lag_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        },
+        "stream": {
+            "length": await redis_conn.xlen(STREAM_KEY),
+            "dead_letters": await redis_conn.xlen(DEAD_LETTER_KEY),
+            "groups": groups,
+        },
+        "workers": {key.decode(): orjson.loads(value) for key, value in workers.items()},
+    }
+
+
+async def log_event(event: Dict[str, Any]) -> None:
+    logger.info(f"{event['event_type']} {event['aggregate_id']}: {json.dumps(event['payload'])}")
+
+
+# Consumer groups and the handlers each runs; side-effect integrations register here
+CONSUMER_GROUPS: Dict[str, Dict[str, Handler]] = {
+    "notifications": {"loan.created": log_event, "payment.processed": log_event},
+}
+
+
+async def main(args) -> None:
+    redis_conn = redis.from_url(REDIS_URL)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    if args.command == "relay":
+        workers = [OutboxRelay(redis_conn, args.batch_size, f"{socket.gethostname()}:{os.getpid()}:{index}")
+                   for index in range(args.concurrency)]
+    else:
+        consumer = args.consumer or f"{socket.gethostname()}:{os.getpid()}"
+        workers = [OutboxConsumer(redis_conn, args.group, f"{consumer}:{index}", CONSUMER_GROUPS[args.group],
+                                  args.batch_size)
+                   for index in range(args.concurrency)]
+
+    try:
+        await asyncio.gather(*(worker.run(stop) for worker in workers))
+    finally:
+        await redis_conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Outbox relay and consumers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    relay_parser = commands.add_parser("relay", help="publish outbox rows to the Redis Stream")
+    relay_parser.add_argument("--batch-size", type=int, default=RELAY_BATCH_SIZE)
+    relay_parser.add_argument("--concurrency", type=int, default=1)
+    consume_parser = commands.add_parser("consume", help="run a consumer group's handlers")
+    consume_parser.add_argument("group", choices=sorted(CONSUMER_GROUPS))
+    consume_parser.add_argument("--consumer", help="consumer name (default host:pid)")
+    consume_parser.add_argument("--batch-size", type=int, default=CONSUMER_BATCH_SIZE)
+    consume_parser.add_argument("--concurrency", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
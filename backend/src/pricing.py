@@ -0,0 +1,167 @@
+"""
+Loan pricing rules, scalar and vectorized.
+
+LoanService prices one application at a time with these constants; the
+NumPy functions below apply the same rules to whole columns of amounts,
+terms and incomes so the book can be repriced in bulk. PortfolioStress
+accumulates "what if" scenarios (base rate moves, income shocks) chunk by
+chunk, so a portfolio of any size is simulated in constant memory.
+
+Run as a CLI to stress the loans table:
+
+  python pricing.py --rate-shift 0.5 --income-shock 0.2
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+
+# Monthly interest rate rules, in percent
+BASE_RATE = 2.5
+LOW_INCOME_THRESHOLD = 5000
+LOW_INCOME_PREMIUM = 0.5
+HIGH_INCOME_THRESHOLD = 15000
+HIGH_INCOME_DISCOUNT = 0.5
+LARGE_LOAN_THRESHOLD = 10000
+LARGE_LOAN_PREMIUM = 0.5
+MIN_RATE = 1.5
+MAX_RATE = 5.0
+
+# Share of net monthly income (income less expenses) a repayment may take
+AFFORDABILITY_RATIO = 1 / 3
+
+
+def interest_rates(amounts, monthly_incomes, base_rate: float = BASE_RATE) -> np.ndarray:
+    """Vectorized calculate_interest_rate: monthly rate (%) per loan"""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    monthly_incomes = np.asarray(monthly_incomes, dtype=np.float64)
+
+    rates = np.full(amounts.shape, base_rate, dtype=np.float64)
+    rates += np.where(monthly_incomes < LOW_INCOME_THRESHOLD, LOW_INCOME_PREMIUM, 0.0)
+    rates -= np.where(monthly_incomes > HIGH_INCOME_THRESHOLD, HIGH_INCOME_DISCOUNT, 0.0)
+    rates += np.where(amounts > LARGE_LOAN_THRESHOLD, LARGE_LOAN_PREMIUM, 0.0)
+    return np.clip(rates, MIN_RATE, MAX_RATE)
+
+
+def total_amounts(amounts, term_months, rates) -> np.ndarray:
+    """Vectorized calculate_total_amount (flat rate over the term)"""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    term_months = np.asarray(term_months, dtype=np.float64)
+    rates = np.asarray(rates, dtype=np.float64)
+    return amounts * (1 + rates / 100 * term_months)
+
+
+def monthly_payments(amounts, term_months, rates) -> np.ndarray:
+    """Vectorized calculate_monthly_payment"""
+    return total_amounts(amounts, term_months, rates) / np.asarray(term_months, dtype=np.float64)
+
+
+def affordable_payments(monthly_incomes, monthly_expenses) -> np.ndarray:
+    """Largest monthly repayment each borrower can carry"""
+    net_income = np.asarray(monthly_incomes, dtype=np.float64) - np.asarray(monthly_expenses, dtype=np.float64)
+    return np.maximum(net_income, 0.0) * AFFORDABILITY_RATIO
+
+
+def max_loan_amounts(monthly_incomes, monthly_expenses, term_months):
+    """Largest affordable principal per borrower and the rate it would be priced at.
+
+    Inverts calculate_monthly_payment for the affordable repayment. The rate
+    depends on the amount (LARGE_LOAN_THRESHOLD), so both tiers are solved and
+    the larger amount that stays consistent with its own tier wins.
+    """
+    monthly_incomes = np.asarray(monthly_incomes, dtype=np.float64)
+    term_months = np.broadcast_to(np.asarray(term_months, dtype=np.float64), monthly_incomes.shape)
+    payments = affordable_payments(monthly_incomes, monthly_expenses)
+
+    small_rates = interest_rates(np.zeros_like(monthly_incomes), monthly_incomes)
+    large_rates = interest_rates(np.full_like(monthly_incomes, np.inf), monthly_incomes)
+    small_amounts = np.minimum(payments * term_months / (1 + small_rates / 100 * term_months), LARGE_LOAN_THRESHOLD)
+    large_amounts = payments * term_months / (1 + large_rates / 100 * term_months)
+
+    use_large = large_amounts > LARGE_LOAN_THRESHOLD
+    return np.where(use_large, large_amounts, small_amounts), np.where(use_large, large_rates, small_rates)
+
+
+class PortfolioStress:
+    """Running totals for one stress scenario over a stream of loan chunks"""
+
+    def __init__(self, name: str, rate_shift: float = 0.0, income_shock: float = 0.0):
+        self.name = name
+        self.rate_shift = rate_shift
+        self.income_shock = income_shock
+        self.loans = 0
+        self.outstanding_balance = 0.0
+        self.principal = 0.0
+        self.weighted_rate_before = 0.0
+        self.weighted_rate_after = 0.0
+        self.monthly_payments_before = 0.0
+        self.monthly_payments_after = 0.0
+        self.total_repayable_after = 0.0
+        self.unaffordable_before = 0
+        self.unaffordable_after = 0
+        self.unaffordable_balance_after = 0.0
+
+    def add_chunk(self, amounts, term_months, rates, remaining_balances,
+                  monthly_incomes, monthly_expenses) -> None:
+        amounts = np.asarray(amounts, dtype=np.float64)
+        remaining_balances = np.asarray(remaining_balances, dtype=np.float64)
+        monthly_incomes = np.asarray(monthly_incomes, dtype=np.float64)
+
+        shocked_incomes = monthly_incomes * (1 - self.income_shock)
+        repriced = interest_rates(amounts, shocked_incomes, BASE_RATE + self.rate_shift)
+        payments_before = monthly_payments(amounts, term_months, rates)
+        payments_after = monthly_payments(amounts, term_months, repriced)
+        unaffordable_before = payments_before > affordable_payments(monthly_incomes, monthly_expenses)
+        unaffordable_after = payments_after > affordable_payments(shocked_incomes, monthly_expenses)
+
+        self.loans += amounts.size
+        self.outstanding_balance += float(remaining_balances.sum())
+        self.principal += float(amounts.sum())
+        self.weighted_rate_before += float(np.dot(amounts, rates))
+        self.weighted_rate_after += float(np.dot(amounts, repriced))
+        self.monthly_payments_before += float(payments_before.sum())
+        self.monthly_payments_after += float(payments_after.sum())
+        self.total_repayable_after += float(total_amounts(amounts, term_months, repriced).sum())
+        self.unaffordable_before += int(unaffordable_before.sum())
+        self.unaffordable_after += int(unaffordable_after.sum())
+        self.unaffordable_balance_after += float(remaining_balances[unaffordable_after].sum())
+
+    def result(self) -> Dict[str, Any]:
+        principal = self.principal or 1.0
+        return {
+            "scenario": self.name,
+            "rate_shift": self.rate_shift,
+            "income_shock": self.income_shock,
+            "loans": self.loans,
+            "outstanding_balance": self.outstanding_balance,
+            "average_rate_before": self.weighted_rate_before / principal,
+            "average_rate_after": self.weighted_rate_after / principal,
+            "monthly_payments_before": self.monthly_payments_before,
+            "monthly_payments_after": self.monthly_payments_after,
+            "total_repayable_after": self.total_repayable_after,
+            "unaffordable_loans_before": self.unaffordable_before,
+            "unaffordable_loans_after": self.unaffordable_after,
+            "unaffordable_balance_after": self.unaffordable_balance_after,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Stress-test the loan book")
+    parser.add_argument("--rate-shift", type=float, default=0.0, help="base rate move, in percentage points")
+    parser.add_argument("--income-shock", type=float, default=0.0, help="fractional income drop, e.g. 0.2")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    from main import PortfolioService
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        results = PortfolioService(db).simulate(
+            [PortfolioStress("cli", args.rate_shift, args.income_shock)], chunk_size=args.chunk_size
+        )
+    print(json.dumps({"results": results, "elapsed_seconds": time.perf_counter() - started}, indent=2))
@@ -0,0 +1,260 @@
+"""
+On-demand per-request profiling.
+
+A request is profiled when it carries a valid ``X-Profile-Token`` header (a
+token signed with PROFILE_SIGNING_KEYS, see ``python profiling.py token``)
+or is picked by PROFILE_SAMPLE_RATE. The request runs under cProfile, every
+SQL statement it executes is timed through engine events, and the result is
+written to PROFILE_DIR as a JSON summary plus a raw ``.prof`` file (open it
+with pstats or snakeviz). Only the newest PROFILE_KEEP profiles are kept.
+The response carries ``X-Profile-Id`` so the caller can fetch the profile
+from the admin endpoints.
+
+cProfile sees the whole event-loop thread, so the call stats also include
+whatever other requests ran while the profiled one was awaiting; the SQL
+timings are scoped to the profiled request through a context variable.
+One request is profiled at a time per process.
+
+When neither setting is configured, main installs neither the middleware
+nor the engine hooks, so requests pay nothing.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import orjson
+from sqlalchemy import event
+
+from session_tokens import InvalidToken, TokenSigner, parse_signing_keys
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_SUBJECT = "profile"
+ADMIN_PATH = "/api/admin/profiles"
+# Call stats kept in the JSON summary, and characters of each SQL statement
+TOP_FUNCTIONS = 60
+MAX_STATEMENT_LENGTH = 2000
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.queries: List[Dict[str, Any]] = []
+
+    def record_query(self, engine_label: str, statement: str, duration: float, executemany: bool, rowcount: int):
+        self.queries.append({
+            "engine": engine_label,
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "duration_ms": round(duration * 1000, 3),
+            "executemany": executemany,
+            "rowcount": rowcount,
+        })
+
+
+def instrument_engine(sync_engine, label: str) -> None:
+    """Time statements executed on behalf of a profiled request"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_profile.get() is not None:
+            conn.info["profile_query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        started = conn.info.pop("profile_query_started", None)
+        if profile is not None and started is not None:
+            profile.record_query(label, statement, time.perf_counter() - started, executemany, cursor.rowcount)
+
+
+def function_stats(stats: pstats.Stats, limit: int, source_only: bool = False) -> List[Dict[str, Any]]:
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        if source_only and not filename.startswith(SOURCE_DIR):
+            continue
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+class ProfileStore:
+    """Profiles on local disk, newest PROFILE_KEEP kept"""
+
+    def __init__(self, directory: str, keep: int = 100):
+        self.directory = directory
+        self.keep = keep
+
+    def path(self, profile_id: str, suffix: str) -> Optional[str]:
+        # Ids are generated here; anything else (path separators included) is not ours
+        if not profile_id.replace("-", "").isalnum():
+            return None
+        path = os.path.join(self.directory, f"{profile_id}{suffix}")
+        return path if os.path.exists(path) else None
+
+    def read(self, profile_id: str, suffix: str) -> Optional[bytes]:
+        path = self.path(profile_id, suffix)
+        if path is None:
+            return None
+        with open(path, "rb") as handle:
+            return handle.read()
+
+    def save(self, profile: RequestProfile, profiler: cProfile.Profile, status: int, elapsed: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        stats.dump_stats(os.path.join(self.directory, f"{profile.id}.prof"))
+
+        sql_ms = sum(query["duration_ms"] for query in profile.queries)
+        summary = {
+            "id": profile.id,
+            "method": profile.method,
+            "path": profile.path,
+            "trigger": profile.trigger,
+            "status": status,
+            "started_at": profile.started_at.isoformat(),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "sql_count": len(profile.queries),
+            "sql_ms": round(sql_ms, 3),
+            "queries": profile.queries,
+            # Our own code (LoanService, PaymentService, ...) first, then everything
+            "app_functions": function_stats(stats, TOP_FUNCTIONS, source_only=True),
+            "functions": function_stats(stats, TOP_FUNCTIONS),
+        }
+        with open(os.path.join(self.directory, f"{profile.id}.json"), "wb") as handle:
+            handle.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+        self.prune()
+
+    def prune(self) -> None:
+        summaries = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in summaries[:-self.keep] if self.keep else summaries:
+            profile_id = name[:-len(".json")]
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Newest first, without the per-query and per-function detail"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted((name for name in os.listdir(self.directory) if name.endswith(".json")), reverse=True):
+            try:
+                with open(os.path.join(self.directory, name), "rb") as handle:
+                    summary = orjson.loads(handle.read())
+            except (OSError, ValueError):
+                continue
+            entries.append({key: summary[key] for key in (
+                "id", "method", "path", "trigger", "status", "started_at", "elapsed_ms", "sql_count", "sql_ms"
+            )})
+        return entries
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling requests picked by signed header or sampling"""
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = 0.0, signer: Optional[TokenSigner] = None):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.signer = signer
+        # cProfile allows one active profiler per thread, and the event loop is one thread
+        self.active = False
+
+    def trigger(self, scope) -> Optional[str]:
+        # Fetching profiles with the token must not rotate out the profile being fetched
+        if scope["path"].startswith(ADMIN_PATH):
+            return None
+        if self.signer is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return "header" if authorized(self.signer, value.decode("latin-1")) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.trigger(scope) if scope["type"] == "http" and not self.active else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], trigger)
+        response_status = [500]
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        self.active = True
+        token = current_profile.set(profile)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            current_profile.reset(token)
+            self.active = False
+            try:
+                await asyncio.to_thread(self.store.save, profile, profiler, response_status[0], elapsed)
+            except Exception as e:
+                logger.error(f"Failed to save profile {profile.id}: {e}")
+
+
+def authorized(signer: Optional[TokenSigner], token: Optional[str]) -> bool:
+    """Whether ``token`` is a live profiling token"""
+    if signer is None or not token:
+        return False
+    try:
+        return signer.verify(token)["sub"] == PROFILE_SUBJECT
+    except InvalidToken:
+        return False
+
+
+def profile_signer(keys: Optional[str]) -> Optional[TokenSigner]:
+    """Signer for profiling tokens, or None when PROFILE_SIGNING_KEYS is not set"""
+    return TokenSigner(parse_signing_keys(keys)) if keys else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request profiling tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    token_parser = commands.add_parser("token", help="mint an X-Profile-Token header value")
+    token_parser.add_argument("--ttl", type=int, default=900, help="seconds the token stays valid")
+    args = parser.parse_args()
+
+    signer = profile_signer(os.getenv("PROFILE_SIGNING_KEYS"))
+    if signer is None:
+        parser.error("PROFILE_SIGNING_KEYS is not set")
+    print(signer.issue(PROFILE_SUBJECT, args.ttl)["token"])
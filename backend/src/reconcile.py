@@ -0,0 +1,99 @@
+"""
+Reconciliation of the per-company portfolio aggregates.
+
+company_portfolios is maintained incrementally by loan creation, payments,
+the accrual job and archival. Anything that changes loans outside those
+paths (manual fixes, rows written before the table existed) makes the
+totals drift. This job recomputes the true totals with one grouped scan of
+loans and corrects each company's row. loan_count, total_disbursed and
+total_paid are lifetime totals, so the loans archival moved out of the hot
+tables, kept per company in archived_portfolios, are added back to them.
+
+The scan and the stored totals are read in one snapshot, and the difference
+between them is applied as a delta through the same upsert the request path
+uses, so loans and payments committed while the scan runs are not
+overwritten. The first run backfills the table.
+
+  python reconcile.py
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import case, func, select, update
+
+from database import SessionLocal, get_engine
+from main import (
+    ARCHIVED_TOTALS, PORTFOLIO_TOTALS, ArchivedPortfolio, CompanyPortfolio, Loan, LoanApplication,
+    add_portfolio_delta, company_portfolio_upsert, portfolio_delta_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+# Float sums are compared to the cent; counts must match exactly
+DRIFT_TOLERANCE = 0.005
+
+
+def company_totals_query():
+    return (
+        select(
+            LoanApplication.company_id,
+            func.count(Loan.id),
+            func.coalesce(func.sum(Loan.amount), 0),
+            func.coalesce(func.sum(func.coalesce(Loan.total_paid, 0)), 0),
+            func.coalesce(func.sum(Loan.remaining_balance), 0),
+            func.coalesce(func.sum(case((Loan.status == "overdue", 1), else_=0)), 0),
+        )
+        .join(LoanApplication, LoanApplication.id == Loan.application_id)
+        .group_by(LoanApplication.company_id)
+    )
+
+
+def reconcile() -> Dict[str, Any]:
+    """Correct drift in company_portfolios; returns the corrections applied"""
+    started = time.perf_counter()
+    engine = get_engine()
+    isolation = {"isolation_level": "REPEATABLE READ"} if engine.dialect.name == "postgresql" else {}
+
+    with engine.connect().execution_options(**isolation) as snapshot, snapshot.begin():
+        actual = {row[0]: dict(zip(PORTFOLIO_TOTALS, row[1:])) for row in snapshot.execute(company_totals_query())}
+        for row in snapshot.execute(select(ArchivedPortfolio.__table__)):
+            totals = actual.setdefault(row.company_id, dict.fromkeys(PORTFOLIO_TOTALS, 0))
+            for name in ARCHIVED_TOTALS:
+                totals[name] += getattr(row, name)
+        stored = {
+            row.company_id: {name: getattr(row, name) for name in PORTFOLIO_TOTALS}
+            for row in snapshot.execute(select(CompanyPortfolio.__table__))
+        }
+
+    deltas: Dict[str, Dict[str, float]] = {}
+    for company_id in actual.keys() | stored.keys():
+        expected = actual.get(company_id, {})
+        current = stored.get(company_id, {})
+        drift = {name: (expected.get(name) or 0) - (current.get(name) or 0) for name in PORTFOLIO_TOTALS}
+        if company_id not in stored or any(abs(value) > DRIFT_TOLERANCE for value in drift.values()):
+            add_portfolio_delta(deltas, company_id, **drift)
+
+    reconciled_at = datetime.utcnow()
+    with SessionLocal() as db:
+        if deltas:
+            db.execute(company_portfolio_upsert(get_engine().dialect.name), portfolio_delta_rows(deltas))
+        db.execute(update(CompanyPortfolio).values(reconciled_at=reconciled_at))
+        db.commit()
+
+    summary = {
+        "companies": len(actual),
+        "corrected": len(deltas),
+        "corrections": deltas,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+    logger.info(f"Reconciled {summary['companies']} companies, corrected {summary['corrected']}")
+    return summary
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(reconcile(), indent=2, default=str))
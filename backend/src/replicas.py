@@ -0,0 +1,101 @@
+"""
+Read routing between the primary and read replicas.
+
+With DATABASE_REPLICA_URLS set, read-only request paths (loan listings,
+schedules, ledgers, portfolio reads) take their session from
+ReadRouter.session(), which round-robins over the replicas. Writes always
+go to the primary.
+
+Replicas lag, so a user who just wrote reads from the primary for
+REPLICA_STICKY_SECONDS afterwards. The pin is recorded in Redis when the
+write commits (so it holds on every worker) and cached in-process for the
+worker that did the write; if Redis cannot be read, the read goes to the
+primary. Keep the window above the replicas' usual lag.
+
+Without replicas every method hands back primary sessions and nothing
+touches Redis.
+"""
+
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# In-process pins are pruned once this many have accumulated
+MAX_LOCAL_PINS = 10000
+
+READ_ROUTING = metrics.registry.counter(
+    "db_read_routing_total", "Read-only sessions by target and reason", ("target", "reason")
+)
+
+
+def sticky_key(user_id: str) -> str:
+    return f"replica:sticky:{user_id}"
+
+
+class ReadRouter:
+    def __init__(self, primary: async_sessionmaker, primary_sync: sessionmaker,
+                 replicas: List[async_sessionmaker], replicas_sync: List[sessionmaker], sticky_seconds: float = 5.0):
+        self.primary = primary
+        self.primary_sync = primary_sync
+        self.replicas = replicas
+        self.replicas_sync = replicas_sync
+        self.sticky_seconds = sticky_seconds
+        self._turn = itertools.count()
+        self._pins: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    async def pin(self, redis_conn, *user_ids: str) -> None:
+        """Send these users' reads to the primary for the sticky window (call after their write commits)"""
+        if not self.enabled or not user_ids:
+            return
+        deadline = time.monotonic() + self.sticky_seconds
+        if len(self._pins) >= MAX_LOCAL_PINS:
+            now = time.monotonic()
+            self._pins = {user_id: until for user_id, until in self._pins.items() if until > now}
+        for user_id in user_ids:
+            self._pins[user_id] = deadline
+        try:
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                for user_id in set(user_ids):
+                    pipe.set(sticky_key(user_id), 1, px=int(self.sticky_seconds * 1000))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to pin reads to the primary: {e}")
+
+    async def is_pinned(self, redis_conn, user_id: str) -> bool:
+        if self._pins.get(user_id, 0) > time.monotonic():
+            return True
+        try:
+            with metrics.REDIS_COMMAND_DURATION.time("replica_sticky"):
+                return bool(await redis_conn.exists(sticky_key(user_id)))
+        except Exception as e:
+            logger.error(f"Read-your-writes check failed, reading from the primary: {e}")
+            return True
+
+    async def session(self, redis_conn=None, user_id: Optional[str] = None) -> AsyncSession:
+        """A new session for a read-only request; ``user_id`` makes it honour that user's recent writes"""
+        if not self.enabled:
+            return self.primary()
+        if user_id is not None and await self.is_pinned(redis_conn, user_id):
+            READ_ROUTING.inc(1, "primary", "sticky")
+            return self.primary()
+        READ_ROUTING.inc(1, "replica", "read_only")
+        return self.replicas[next(self._turn) % len(self.replicas)]()
+
+    def sync_session(self) -> Session:
+        """A new sync session for whole-book reads that do not depend on one user's writes"""
+        if not self.enabled:
+            return self.primary_sync()
+        READ_ROUTING.inc(1, "replica", "read_only")
+        return self.replicas_sync[next(self._turn) % len(self.replicas_sync)]()
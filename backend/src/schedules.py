@@ -0,0 +1,128 @@
+"""
+Amortization schedules for flat-rate loans.
+
+Loans are priced with a flat monthly rate (see LoanService): interest is
+charged on the original principal every period, and principal is repaid in
+equal instalments. Amounts are rounded to cents per period, with the final
+period absorbing the rounding remainder so the schedule sums exactly to the
+loan's total.
+
+Schedules depend only on (amount, term, rate), which repeat heavily across
+the book, so they are memoized in an LRU cache with a TTL. Entries hold
+compact ``array('d')`` columns (a 60-month schedule is under 2 KB); due dates
+are not cached but derived per loan from its start date when rendered.
+"""
+
+import calendar
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+ScheduleKey = Tuple[float, int, float]
+
+
+class Schedule:
+    __slots__ = ("principal", "interest", "balance")
+
+    def __init__(self, principal: array, interest: array, balance: array):
+        self.principal = principal
+        self.interest = interest
+        self.balance = balance
+
+    def __len__(self) -> int:
+        return len(self.principal)
+
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in (self.principal, self.interest, self.balance))
+
+
+def build_schedule(amount: float, term_months: int, interest_rate: float) -> Schedule:
+    """Per-period principal, interest and remaining principal for a flat-rate loan"""
+    principal_cents = round(amount * 100)
+    interest_total_cents = round(amount * interest_rate * term_months)  # amount * rate% * term, in cents
+    instalment_cents = principal_cents // term_months
+    interest_cents = interest_total_cents // term_months
+
+    principal = array("d")
+    interest = array("d")
+    balance = array("d")
+    remaining = principal_cents
+    for period in range(1, term_months + 1):
+        # The last period picks up whatever integer division left over
+        last = period == term_months
+        paid = remaining if last else instalment_cents
+        charged = interest_total_cents - interest_cents * (term_months - 1) if last else interest_cents
+        remaining -= paid
+        principal.append(paid / 100)
+        interest.append(charged / 100)
+        balance.append(remaining / 100)
+    return Schedule(principal, interest, balance)
+
+
+def add_months(start: datetime, months: int) -> datetime:
+    """Same day-of-month ``months`` later, clamped to the end of shorter months"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+def render_schedule(schedule: Schedule, start: datetime) -> List[Dict[str, Any]]:
+    """Expand a cached schedule into per-period rows with due dates from ``start``"""
+    return [
+        {
+            "period": index + 1,
+            "due_date": add_months(start, index + 1),
+            "payment": round(schedule.principal[index] + schedule.interest[index], 2),
+            "principal": schedule.principal[index],
+            "interest": schedule.interest[index],
+            "balance": schedule.balance[index],
+        }
+        for index in range(len(schedule))
+    ]
+
+
+class ScheduleCache:
+    """LRU cache of schedules keyed on pricing inputs, with a TTL per entry"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[ScheduleKey, Tuple[float, Schedule]]" = OrderedDict()
+
+    @staticmethod
+    def key(amount: float, term_months: int, interest_rate: float) -> ScheduleKey:
+        return round(amount, 2), int(term_months), round(interest_rate, 6)
+
+    def get(self, amount: float, term_months: int, interest_rate: float) -> Schedule:
+        key = self.key(amount, term_months, interest_rate)
+        now = time.monotonic()
+
+        entry: Optional[Tuple[float, Schedule]] = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        schedule = build_schedule(*key)
+        self._entries[key] = (now + self.ttl, schedule)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return schedule
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": sum(schedule.nbytes() for _, schedule in self._entries.values()),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
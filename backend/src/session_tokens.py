@@ -0,0 +1,146 @@
+"""
+Stateless, HMAC-signed session tokens.
+
+A token carries its own subject, expiry and token id (jti), so it can be
+verified in-process without a Redis round-trip:
+
+  v1.<kid>.<base64url payload>.<base64url HMAC-SHA256>
+
+Signing keys are configured as ``kid:secret`` pairs in SESSION_SIGNING_KEYS;
+the first pair signs new tokens and every listed key is accepted, so keys can
+be rotated by prepending a new one and dropping the old one once its tokens
+have expired. JWT_SECRET stands in when SESSION_SIGNING_KEYS is empty; with
+neither set the API refuses to start rather than sign tokens that no other
+worker, or the next deploy, could verify. Revoked token ids live in a Redis
+sorted set and are mirrored into a local deny-list that refreshes in the
+background.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = "v1"
+REVOKED_KEY = "session:revoked"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def parse_signing_keys(value: Optional[str], fallback_secret: Optional[str] = None) -> Dict[str, bytes]:
+    """Parse ``kid:secret,kid:secret`` into an ordered key map (first key signs).
+
+    Raises ValueError when neither ``value`` nor ``fallback_secret`` provides a key.
+    """
+    keys: Dict[str, bytes] = {}
+    for pair in (value or "").split(","):
+        kid, _, secret = pair.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret.encode()
+
+    if not keys and fallback_secret:
+        keys["default"] = fallback_secret.encode()
+    if not keys:
+        raise ValueError("No session signing key configured: set SESSION_SIGNING_KEYS (kid:secret) or JWT_SECRET")
+    return keys
+
+
+def looks_signed(token: str) -> bool:
+    return token.startswith(TOKEN_VERSION + ".")
+
+
+class TokenSigner:
+    def __init__(self, keys: Dict[str, bytes]):
+        self.keys = keys
+        self.active_kid = next(iter(keys))
+
+    def _signature(self, kid: str, signing_input: str) -> str:
+        digest = hmac.new(self.keys[kid], signing_input.encode(), hashlib.sha256).digest()
+        return _b64encode(digest)
+
+    def issue(self, subject: str, ttl_seconds: int) -> Dict[str, object]:
+        """Create a token for ``subject``; returns the token with its jti and expiry"""
+        claims = {"sub": subject, "jti": uuid.uuid4().hex, "exp": int(time.time()) + ttl_seconds}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = f"{TOKEN_VERSION}.{self.active_kid}.{payload}"
+        return {"token": f"{signing_input}.{self._signature(self.active_kid, signing_input)}", **claims}
+
+    def verify(self, token: str) -> Dict[str, object]:
+        """Check signature and expiry; raises InvalidToken"""
+        try:
+            version, kid, payload, signature = token.split(".")
+        except ValueError:
+            raise InvalidToken("malformed token")
+        if version != TOKEN_VERSION or kid not in self.keys:
+            raise InvalidToken("unknown signing key")
+
+        expected = self._signature(kid, f"{version}.{kid}.{payload}")
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidToken("bad signature")
+
+        claims = json.loads(_b64decode(payload))
+        if claims["exp"] <= time.time():
+            raise InvalidToken("token expired")
+        return claims
+
+
+class RevocationList:
+    """Local mirror of revoked token ids, refreshed from Redis in the background"""
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.revoked: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self.revoked
+
+    async def revoke(self, redis_conn, jti: str, expires_at: int) -> None:
+        # Entries are scored by token expiry so they can be pruned once the token is dead anyway
+        await redis_conn.zadd(REVOKED_KEY, {jti: expires_at})
+        self.revoked.add(jti)
+
+    async def refresh(self, redis_conn) -> None:
+        now = int(time.time())
+        await redis_conn.zremrangebyscore(REVOKED_KEY, "-inf", now)
+        members = await redis_conn.zrangebyscore(REVOKED_KEY, now, "+inf")
+        self.revoked = {member.decode() if isinstance(member, bytes) else member for member in members}
+
+    async def _refresh_forever(self, get_redis) -> None:
+        while True:
+            try:
+                await self.refresh(await get_redis())
+            except Exception as e:
+                # Keep serving with the last known list if Redis is unavailable
+                logger.error(f"Revocation list refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self, get_redis) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever(get_redis))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
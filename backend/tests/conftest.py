@@ -0,0 +1,80 @@
+"""
+Shared setup for the backend tests: run from backend/ with ``python -m pytest``.
+
+The API reads its configuration at import, so the environment is pinned
+here, before any test module imports it: a throwaway SQLite database, no
+login throttling and a fixed session signing key. Redis is fakeredis.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.sqlite')}"
+os.environ["LOGIN_RATE_LIMIT_PER_EMAIL"] = "0"
+os.environ["LOGIN_RATE_LIMIT_PER_ADDRESS"] = "0"
+os.environ["SESSION_SIGNING_KEYS"] = "test:tests-signing-secret-at-least-32-characters"
+os.environ["ARCHIVE_DIR"] = os.path.join(tempfile.mkdtemp(), "archive")
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def api():
+    """The API module, with the schema migrated"""
+    import main
+    import migrate
+
+    migrate.upgrade()
+    return main
+
+
+@pytest.fixture
+def redis_server(api, monkeypatch):
+    """One fake Redis shared by the API's async client and the jobs' sync clients"""
+    import redis as redis_sync
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(api, "redis_client", fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(redis_sync.Redis, "from_url",
+                        classmethod(lambda cls, *args, **kwargs: fakeredis.FakeRedis(server=server)))
+    return server
+
+
+@pytest.fixture
+async def client(api, redis_server):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+    await api.database.dispose_engines()
+
+
+async def login(client, email: str) -> dict:
+    """Authorization headers for ``email``"""
+    response = await client.post("/api/auth/login", json={"email": email, "password": "test"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def create_loan(client, headers: dict, user_id: str, amount: float = 10000, term: int = 12) -> str:
+    """Apply for a loan through the API; returns the new loan's id"""
+    response = await client.post("/api/loans", headers=headers, json={
+        "application_id": f"TEST-{os.urandom(8).hex()}",
+        "user_id": user_id,
+        "company_id": "test-company",
+        "employee_verification_id": "test-verification",
+        "loan_amount": amount,
+        "loan_term": term,
+        "monthly_income": 20000,
+    })
+    response.raise_for_status()
+    return response.json()["data"]["loan"]["id"]
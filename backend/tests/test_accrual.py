@@ -0,0 +1,92 @@
+import importlib
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from conftest import create_loan, login
+
+pytestmark = pytest.mark.anyio
+
+
+async def disburse(client, headers, loan_id: str) -> dict:
+    response = await client.post(f"/api/loans/{loan_id}/disburse", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+async def test_disbursed_loan_is_accrued(api, client):
+    import accrual
+
+    headers = await login(client, "borrower@buffr.ai")
+    loan_id = await create_loan(client, headers, "borrower@buffr.ai", amount=6000, term=6)
+    disbursed = await disburse(client, headers, loan_id)
+    assert disbursed["status"] == "active"
+    async with api.AsyncSessionLocal() as db:
+        loan = await db.get(api.Loan, loan_id)
+    assert loan.disbursement_date is not None
+
+    # Two instalments due and nothing paid
+    as_of = loan.disbursement_date.date() + timedelta(days=65)
+    results = accrual.run(as_of)
+    assert sum(result["processed"] for result in results) >= 1
+
+    async with api.AsyncSessionLocal() as db:
+        accrued = await db.get(api.Loan, loan_id)
+        ledger = await db.scalar(select(func.sum(api.LedgerEntry.amount)).where(api.LedgerEntry.loan_id == loan_id))
+    interest = round(6000 * loan.interest_rate / 100 * 2, 2)
+    assert accrued.status == "overdue"
+    assert accrued.interest_balance == pytest.approx(interest)
+    assert accrued.remaining_balance == pytest.approx(6000 + interest)
+    assert ledger == pytest.approx(accrued.remaining_balance)
+    assert accrued.maturity_date.date() == loan.maturity_date.date()
+    await api.database.dispose_engines()
+
+
+async def test_pending_loan_is_not_accrued(api, client):
+    import accrual
+
+    headers = await login(client, "borrower@buffr.ai")
+    loan_id = await create_loan(client, headers, "borrower@buffr.ai", amount=6000, term=6)
+    disbursed_id = await create_loan(client, headers, "borrower@buffr.ai", amount=6000, term=6)
+    await disburse(client, headers, disbursed_id)
+    async with api.AsyncSessionLocal() as db:
+        before = await db.get(api.Loan, loan_id)
+    assert (before.status, before.disbursement_date) == ("pending", None)
+
+    # A run date of its own, so the job has no completed checkpoint for it
+    accrual.run(before.created_at.date() + timedelta(days=75))
+
+    async with api.AsyncSessionLocal() as db:
+        after = await db.get(api.Loan, loan_id)
+        entries = await db.scalar(select(func.count()).where(api.LedgerEntry.loan_id == loan_id))
+        disbursed = await db.get(api.Loan, disbursed_id)
+    assert (after.status, after.interest_balance, after.remaining_balance) == (
+        "pending", before.interest_balance, before.remaining_balance
+    )
+    assert entries == 1  # the disbursement booking only
+    assert (disbursed.status, disbursed.remaining_balance) == ("overdue", pytest.approx(6000 + disbursed.interest_balance))
+    await api.database.dispose_engines()
+
+
+async def test_loan_is_disbursed_once(api, client):
+    headers = await login(client, "borrower@buffr.ai")
+    loan_id = await create_loan(client, headers, "borrower@buffr.ai", amount=1000)
+    await disburse(client, headers, loan_id)
+
+    response = await client.post(f"/api/loans/{loan_id}/disburse", headers=headers)
+    assert response.status_code == 409
+    response = await client.post("/api/loans/no-such-loan/disburse", headers=headers)
+    assert response.status_code == 404
+
+
+def test_migration_backfills_disbursement_date(api):
+    backfill = importlib.import_module("migrations.0004_backfill_disbursement_date")
+    with api.database.get_engine().begin() as connection:
+        connection.execute(text("UPDATE loans SET disbursement_date = NULL"))
+        backfill.upgrade(connection)
+        missing = dict(connection.execute(text(
+            "SELECT status = 'pending', count(*) FROM loans WHERE disbursement_date IS NULL GROUP BY 1"
+        )).all())
+        pending = connection.execute(text("SELECT count(*) FROM loans WHERE status = 'pending'")).scalar()
+    assert missing == {1: pending}
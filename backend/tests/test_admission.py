@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionMiddleware, RouteClass, default_classes
+
+pytestmark = pytest.mark.anyio
+
+
+class Backend:
+    """ASGI app that holds every request until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self, scope, receive, send):
+        self.started += 1
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def admitted(backend, classes, pressure: float = 0.0) -> httpx.AsyncClient:
+    app = AdmissionMiddleware(backend, classes=classes, pressure=lambda: pressure, max_checkout_wait=0.5)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def started(backend: Backend, count: int) -> None:
+    while backend.started < count:
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.parametrize("pressure, shed", [
+    (0.6, ["/api/loans"]),
+    (1.1, ["/api/loans", "/api/dashboard"]),
+    (2.1, ["/api/loans", "/api/dashboard", "/api/auth/login"]),
+])
+async def test_pool_pressure_sheds_lower_priorities_first(pressure, shed):
+    backend = Backend()
+    backend.release.set()
+    async with admitted(backend, default_classes(4), pressure) as http:
+        for path in ("/api/loans", "/api/dashboard", "/api/auth/login"):
+            response = await http.get(path)
+            assert response.status_code == (503 if path in shed else 200), path
+            if path in shed:
+                assert int(response.headers["retry-after"]) >= 1
+        # Payments are never shed for pressure, nor are health checks and scrapes
+        assert (await http.post("/api/payments")).status_code == 200
+        assert (await http.get("/metrics")).status_code == 200
+
+
+async def test_full_class_rejects_without_touching_others():
+    backend = Backend()
+    classes = {
+        "listings": RouteClass("listings", 3, limit=2, max_queue=1, queue_timeout=5.0),
+        "default": RouteClass("default", 2, limit=1, max_queue=0, queue_timeout=1.0),
+        "payments": RouteClass("payments", 0, limit=1, max_queue=0, queue_timeout=1.0),
+    }
+    async with admitted(backend, classes) as http:
+        running = [asyncio.ensure_future(http.get("/api/loans")) for _ in range(3)]
+        await asyncio.wait_for(started(backend, 2), timeout=5)
+        while classes["listings"].queued < 1:
+            await asyncio.sleep(0.001)
+
+        refused = await http.get("/api/loans")
+        assert refused.status_code == 503 and "retry-after" in refused.headers
+
+        payment = asyncio.ensure_future(http.post("/api/payments"))
+        await asyncio.wait_for(started(backend, 3), timeout=5)
+        backend.release.set()
+        assert [response.status_code for response in await asyncio.gather(*running, payment)] == [200] * 4
+    assert [(c.in_flight, c.queued) for c in classes.values()] == [(0, 0)] * 3
+
+
+async def test_queued_request_times_out():
+    backend = Backend()
+    classes = {"default": RouteClass("default", 2, limit=1, max_queue=1, queue_timeout=0.05)}
+    async with admitted(backend, classes) as http:
+        holder = asyncio.ensure_future(http.get("/api/dashboard"))
+        await asyncio.wait_for(started(backend, 1), timeout=5)
+        assert (await http.get("/api/dashboard")).status_code == 503
+        backend.release.set()
+        assert (await holder).status_code == 200
+    assert (classes["default"].in_flight, classes["default"].queued) == (0, 0)
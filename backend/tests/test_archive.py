@@ -0,0 +1,61 @@
+import os
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from conftest import create_loan, login
+from test_payments import payment
+
+pytestmark = pytest.mark.anyio
+
+
+async def company_totals(api, company_id: str) -> dict:
+    async with api.AsyncSessionLocal() as db:
+        row = await db.get(api.CompanyPortfolio, company_id, populate_existing=True)
+        return {name: getattr(row, name) for name in api.PORTFOLIO_TOTALS}
+
+
+async def test_archived_loan_round_trips_through_the_reader(api, client):
+    import archive
+    import reconcile
+
+    headers = await login(client, "archived@buffr.ai")
+    loan_id = await create_loan(client, headers, "archived@buffr.ai", amount=1000)
+    for amount in (400, 10 ** 6):
+        response = await client.post("/api/payments", headers=headers, json=payment(loan_id, amount))
+        assert response.status_code == 200, response.text
+    async with api.AsyncSessionLocal() as db:
+        loan = await db.get(api.Loan, loan_id)
+        application = await db.get(api.LoanApplication, loan.application_id)
+    assert loan.status == "completed"
+    before = await company_totals(api, application.company_id)
+
+    # Closed today, so a run dated tomorrow with no grace period archives it
+    result = archive.run(older_than_days=0, as_of=date.today() + timedelta(days=1))
+    assert result["loans"] >= 1 and result["loan_applications"] == result["loans"]
+
+    async with api.AsyncSessionLocal() as db:
+        assert await db.get(api.Loan, loan_id) is None
+        assert await db.scalar(select(api.LoanApplication.id).where(api.LoanApplication.id == application.id)) is None
+
+    reader = archive.ArchiveReader(os.environ["ARCHIVE_DIR"])
+    archived = reader.loan(loan_id)
+    assert (archived["status"], archived["total_paid"], archived["remaining_balance"]) == ("completed", 1000400, 0)
+    assert archived["company_id"] == application.company_id
+    history = list(reader.history(loan_id))
+    kinds = [kind for kind, _ in history]
+    assert kinds == ["application"] + ["payment"] * 2 + ["ledger_entry"] * 3
+    assert history[0][1]["application_id"] == application.application_id
+    assert [row["amount"] for kind, row in history if kind == "payment"] == [400, 10 ** 6]
+    assert sum(row["amount"] for kind, row in history if kind == "ledger_entry") == pytest.approx(0)
+
+    # Lifetime totals keep counting the archived loan, and reconciliation agrees with them
+    assert await company_totals(api, application.company_id) == pytest.approx(before)
+    assert application.company_id not in reconcile.reconcile()["corrections"]
+    assert await company_totals(api, application.company_id) == pytest.approx(before)
+
+    response = await client.get(f"/api/loans/{loan_id}/archive", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.text.count("\n") == 1 + len(history)
+    await api.database.dispose_engines()
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), "..", "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from baseline import HIGHER_IS_BETTER, LOWER_IS_BETTER, compare, metric, save_results  # noqa: E402
+
+
+@pytest.fixture
+def saved(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    save_results(path, "bench", {"size": 10}, {
+        "latency_ms": metric(10.0, LOWER_IS_BETTER),
+        "throughput": metric(100.0, HIGHER_IS_BETTER),
+        "errors": metric(0, LOWER_IS_BETTER),
+    })
+    return path
+
+
+@pytest.mark.parametrize("latency, throughput, errors, passes", [
+    (11.0, 95.0, 0, True),     # within 15% both ways
+    (8.0, 150.0, 0, True),     # improvements never fail
+    (12.0, 100.0, 0, False),   # slower
+    (10.0, 80.0, 0, False),    # less throughput
+    (10.0, 100.0, 1, False),   # any error against a clean baseline
+])
+def test_compare_flags_moves_in_the_wrong_direction(saved, latency, throughput, errors, passes):
+    current = {
+        "latency_ms": metric(latency, LOWER_IS_BETTER),
+        "throughput": metric(throughput, HIGHER_IS_BETTER),
+        "errors": metric(errors, LOWER_IS_BETTER),
+        "new_metric": metric(1.0, LOWER_IS_BETTER),
+    }
+    assert compare(saved, "bench", {"size": 10}, current, tolerance=15.0) is passes
+
+
+def test_compare_refuses_another_benchmarks_results(saved):
+    with pytest.raises(SystemExit):
+        compare(saved, "other-bench", {"size": 10}, {}, tolerance=15.0)
+
+
+def test_benchmark_saves_and_compares_against_its_own_baseline(tmp_path):
+    path = str(tmp_path / "baseline-pricing.json")
+    command = [sys.executable, os.path.join(BENCHMARKS, "pricing_bench.py"), "--size", "1000", "--calls", "50",
+               "--repeat", "3"]
+    subprocess.run([*command, "--save", path], check=True, capture_output=True)
+    with open(path) as handle:
+        results = json.load(handle)
+    assert results["benchmark"] and results["metrics"]
+
+    # A generous tolerance absorbs timing noise between two runs of the same code
+    assert subprocess.run([*command, "--baseline", path, "--tolerance", "10000"], capture_output=True).returncode == 0
+
+    # Against a baseline a thousand times faster, every timing is a regression
+    for value in results["metrics"].values():
+        value["value"] /= 1000
+    with open(path, "w") as handle:
+        json.dump(results, handle)
+    regressed = subprocess.run([*command, "--baseline", path], capture_output=True, text=True)
+    assert regressed.returncode == 1 and "REGRESSION" in regressed.stdout
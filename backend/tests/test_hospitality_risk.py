@@ -0,0 +1,33 @@
+import pytest
+
+from conftest import login
+
+pytestmark = pytest.mark.anyio
+
+
+def hospitality_property(property_id: str, **fields) -> dict:
+    return {"property_id": property_id, "property_name": f"Lodge {property_id}", "requested_amount": 250000,
+            "rooms": 20, "average_daily_rate": 1200, "occupancy_rate": 0.65, **fields}
+
+
+async def test_properties_sharing_inputs_are_each_cached(client):
+    headers = await login(client, "hospitality@buffr.ai")
+    batch = {"properties": [hospitality_property("lodge-a"), hospitality_property("lodge-b")]}
+
+    first = await client.post("/hospitality-property-loans/batch", headers=headers, json=batch)
+    assert first.status_code == 200, first.text
+    assert [offer["cached"] for offer in first.json()["data"]] == [False, False]
+
+    second = await client.post("/hospitality-property-loans/batch", headers=headers, json=batch)
+    assert [offer["cached"] for offer in second.json()["data"]] == [True, True]
+    assert second.json()["data"][1]["risk_score"] == first.json()["data"][1]["risk_score"]
+
+
+async def test_changed_inputs_miss_the_cache(client):
+    headers = await login(client, "hospitality@buffr.ai")
+    await client.post("/hospitality-property-loans/batch", headers=headers,
+                      json={"properties": [hospitality_property("lodge-c")]})
+
+    response = await client.post("/hospitality-property-loans/batch", headers=headers,
+                                 json={"properties": [hospitality_property("lodge-c", rooms=40)]})
+    assert response.json()["data"][0]["cached"] is False
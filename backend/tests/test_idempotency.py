@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from idempotency import IdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store():
+    return IdempotencyStore(fakeredis.FakeAsyncRedis(), lock_ttl=1, wait_timeout=0.2)
+
+
+async def test_claim_is_renewed_while_the_handler_runs(store):
+    async def slow():
+        await asyncio.sleep(1.5)
+        return {"ok": True}
+
+    assert await store.run("key", {"a": 1}, slow) == {"ok": True}
+    record = json.loads(await store.redis.get("key"))
+    assert record["state"] == "completed"
+
+
+async def test_expired_claim_cannot_overwrite_or_release_the_new_owner(store):
+    fingerprint = "fingerprint"
+    stale = store.claim(fingerprint, "stale-owner")
+    current = store.claim(fingerprint, "current-owner")
+    await store.redis.set("key", current)
+
+    assert not await store.complete("key", stale, fingerprint, 200, {"stale": True})
+    assert not await store.release("key", stale)
+    assert await store.redis.get("key") == current.encode()
+
+    assert await store.release("key", current)
+    assert await store.redis.get("key") is None
+
+
+async def test_server_error_releases_only_its_own_claim(store):
+    async def failing():
+        raise HTTPException(status_code=500, detail="boom")
+
+    with pytest.raises(HTTPException):
+        await store.run("key", {"a": 1}, failing)
+    assert await store.redis.get("key") is None
+
+
+async def test_duplicate_replays_stored_response(store):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    assert await store.run("key", {"a": 1}, handler) == {"n": 1}
+    replay = await store.run("key", {"a": 1}, handler)
+    assert json.loads(replay.body) == {"n": 1}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from conftest import create_loan, login
+from ingest import MAX_LINE_BYTES, LineTooLong, iter_lines
+
+pytestmark = pytest.mark.anyio
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(chunks, **kwargs):
+    return [line async for line in iter_lines(stream(*chunks), **kwargs)]
+
+
+async def test_lines_split_across_chunks_are_reassembled():
+    assert await collect([b"a,b\nc", b"d", b"e\n", b"\nf"]) == [b"a,b", b"cde", b"", b"f"]
+
+
+async def test_line_longer_than_the_limit_is_rejected_without_buffering_the_rest():
+    async def endless():
+        yield b"ok\n"
+        while True:
+            yield b"x" * 1024
+
+    with pytest.raises(LineTooLong) as error:
+        async for _ in iter_lines(endless(), max_line_bytes=4096):
+            pass
+    assert error.value.line_number == 2
+
+    with pytest.raises(LineTooLong):
+        await collect([b"short\n", b"y" * 10 + b"\n"], max_line_bytes=8)
+
+
+async def test_ingest_answers_413_for_an_overlong_line(api, client):
+    headers = await login(client, "payer@buffr.ai")
+    loan_id = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+    row = {"loan_id": loan_id, "amount": 10, "payment_date": "2026-10-01"}
+    body = json.dumps(row) + "\n" + json.dumps({**row, "note": "z" * MAX_LINE_BYTES}) + "\n"
+
+    response = await client.post("/api/payments/ingest", headers={**headers, "Content-Type": "application/x-ndjson"},
+                                 content=body)
+    assert response.status_code == 413
+    assert f"line 2 is longer than {MAX_LINE_BYTES} bytes" in response.json()["detail"]
+
+
+async def test_prequalification_reports_an_overlong_line_in_band(client):
+    headers = await login(client, "employer@buffr.ai")
+    body = "employee_id,monthly_income,monthly_expenses\ne-1,20000,5000\ne-2," + "9" * MAX_LINE_BYTES + ",0\n"
+
+    response = await client.post("/api/prequalification", headers={**headers, "Content-Type": "text/csv"},
+                                 content=body)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-2] == {"line": 3, "error": f"line 3 is longer than {MAX_LINE_BYTES} bytes"}
+    assert lines[-1]["summary"]["employees"] == 0
+    assert lines[-1]["summary"]["error"] == lines[-2]["error"]
+
+
+async def test_roster_prequalification_prices_each_employee(api, client):
+    headers = await login(client, "employer@buffr.ai")
+    roster = ("employee_id,monthly_income,monthly_expenses\n"
+              "e-1,20000,5000\n"
+              "e-2,4000,4000\n"
+              ",9000,100\n"
+              "e-4,-1,0\n"
+              "e-5,60000,0\n")
+
+    response = await client.post("/api/prequalification", params={"term_months": 12, "max_amount": 50000},
+                                 headers={**headers, "Content-Type": "text/csv"}, content=roster)
+    assert response.status_code == 200, response.text
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines.pop()["summary"]
+    results = {line["line"]: line for line in lines}
+    assert summary == {"employees": 3, "qualified": 2, "rejected": 2}
+
+    assert results[4]["error"] == "employee_id is required"
+    assert results[5]["error"] == "monthly_income and monthly_expenses must not be negative"
+    assert (results[3]["qualifies"], results[3]["max_loan_amount"]) == (False, 0)
+
+    service = api.LoanService(None)
+    for line, income, expenses in ((2, 20000, 5000), (6, 60000, 0)):
+        offer = results[line]
+        assert offer["qualifies"] and 0 < offer["max_loan_amount"] <= 50000
+        assert offer["interest_rate"] == service.calculate_interest_rate(offer["max_loan_amount"], income)
+        assert offer["monthly_payment"] == pytest.approx(
+            service.calculate_monthly_payment(offer["max_loan_amount"], 12, offer["interest_rate"])
+        )
+        assert offer["affordable_payment"] == pytest.approx((income - expenses) / 3)
+        assert offer["monthly_payment"] <= offer["affordable_payment"]
+    # The cap binds for the high earner
+    assert results[6]["max_loan_amount"] == 50000
+
+    ndjson = "\n".join(json.dumps({"employee_id": "e-1", "monthly_income": 20000, "monthly_expenses": 5000})
+                       for _ in range(2))
+    response = await client.post("/api/prequalification", params={"term_months": 12, "min_amount": 10 ** 6},
+                                 headers={**headers, "Content-Type": "application/x-ndjson"}, content=ndjson)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["summary"] == {"employees": 2, "qualified": 0, "rejected": 0}
+    assert [line["qualifies"] for line in lines[:-1]] == [False, False]
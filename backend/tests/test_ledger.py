@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from conftest import create_loan, login
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_adjustment_survives_accrual_and_replays_clean(api, client):
+    import accrual
+    import ledger
+
+    headers = await login(client, "borrower@buffr.ai")
+    loan_id = await create_loan(client, headers, "borrower@buffr.ai", amount=6000, term=6)
+    response = await client.post(f"/api/loans/{loan_id}/disburse", headers=headers)
+    assert response.status_code == 200, response.text
+
+    assert ledger.adjust(loan_id, -25, memo="goodwill credit")["applied"] == -25
+
+    async with api.AsyncSessionLocal() as db:
+        loan = await db.get(api.Loan, loan_id)
+    # A run date no other test uses, so the job has no completed checkpoint for it
+    accrual.run(loan.disbursement_date.date() + timedelta(days=70))
+
+    async with api.AsyncSessionLocal() as db:
+        accrued = await db.get(api.Loan, loan_id)
+        balance = await db.scalar(select(func.sum(api.LedgerEntry.amount)).where(api.LedgerEntry.loan_id == loan_id))
+    assert accrued.adjustments_total == -25
+    assert accrued.remaining_balance == pytest.approx(6000 + accrued.interest_balance - 25)
+    assert balance == pytest.approx(accrued.remaining_balance)
+
+    result = ledger.replay()
+    assert result["mismatched"] == 0, result["mismatched_loan_ids"]
+    await api.database.dispose_engines()
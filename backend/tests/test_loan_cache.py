@@ -0,0 +1,122 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from loan_cache import LoanListCache, bump_versions, listing_etag, version_key
+
+pytestmark = pytest.mark.anyio
+
+
+async def load_page():
+    return b"page"
+
+
+class FailingPipeline:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def eval(self, *args):
+        pass
+
+    async def execute(self):
+        raise ConnectionError("bump lost")
+
+
+@pytest.fixture
+def redis_conn():
+    return fakeredis.FakeAsyncRedis()
+
+
+async def test_bump_invalidates_etag_and_keeps_versions_increasing(redis_conn):
+    cache = LoanListCache()
+    etag, _ = await cache.get_or_load(redis_conn, "user", "all", load_page)
+    assert await cache.revalidate(redis_conn, "user", "all", etag) == etag
+    before = int(await redis_conn.get(version_key("user")))
+
+    await cache.invalidate(redis_conn, "user")
+
+    assert int(await redis_conn.get(version_key("user"))) > before
+    assert await redis_conn.ttl(version_key("user")) > 0
+    assert await cache.revalidate(redis_conn, "user", "all", etag) is None
+
+
+async def test_failed_bump_resets_the_version_so_no_stale_304(redis_conn, monkeypatch):
+    cache = LoanListCache()
+    etag, _ = await cache.get_or_load(redis_conn, "user", "all", load_page)
+    monkeypatch.setattr(redis_conn, "pipeline", lambda **kwargs: FailingPipeline())
+
+    await cache.invalidate(redis_conn, "user")
+
+    assert await redis_conn.get(version_key("user")) is None
+    assert await cache.revalidate(redis_conn, "user", "all", etag) is None
+    monkeypatch.undo()
+    fresh, _ = await cache.get_or_load(redis_conn, "user", "all", load_page)
+    assert fresh != etag
+
+
+async def test_expired_version_is_reseeded_past_every_earlier_version(redis_conn):
+    cache = LoanListCache()
+    await redis_conn.set(version_key("user"), 5)
+    old = listing_etag("user", "all", "5")
+    await redis_conn.delete(version_key("user"))
+
+    etag, _ = await cache.get_or_load(redis_conn, "user", "all", load_page)
+
+    assert etag != old
+    assert int(await redis_conn.get(version_key("user"))) > 5
+
+
+def test_batch_bump_matches_the_request_path():
+    client = fakeredis.FakeRedis()
+    bump_versions(client, ["a", "b"])
+    assert all(int(client.get(version_key(user))) > 0 and client.ttl(version_key(user)) > 0 for user in "ab")
+
+
+async def collapsed(cache: LoanListCache, waiters: int) -> None:
+    """Return once ``waiters`` readers are waiting on another reader's load"""
+    while cache.collapsed < waiters:
+        await asyncio.sleep(0.001)
+
+
+async def test_concurrent_misses_share_one_load(redis_conn):
+    cache = LoanListCache()
+    release = asyncio.Event()
+    calls = 0
+
+    async def slow_load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return b"page"
+
+    readers = [asyncio.ensure_future(cache.get_or_load(redis_conn, "user", "all", slow_load)) for _ in range(10)]
+    await asyncio.wait_for(collapsed(cache, 9), timeout=5)
+    release.set()
+    results = await asyncio.gather(*readers)
+
+    assert calls == 1
+    assert len(set(results)) == 1 and results[0][1] == b"page"
+    assert (cache.misses, cache.collapsed) == (1, 9)
+    assert await cache.get_or_load(redis_conn, "user", "all", slow_load) == results[0]
+    assert (calls, cache.hits) == (1, 1)
+
+
+async def test_failed_load_reaches_every_waiter_and_is_not_cached(redis_conn):
+    cache = LoanListCache()
+    release = asyncio.Event()
+
+    async def failing_load():
+        await release.wait()
+        raise RuntimeError("database unavailable")
+
+    readers = [asyncio.ensure_future(cache.get_or_load(redis_conn, "user", "all", failing_load)) for _ in range(3)]
+    await asyncio.wait_for(collapsed(cache, 2), timeout=5)
+    release.set()
+    results = await asyncio.gather(*readers, return_exceptions=True)
+
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert (await cache.get_or_load(redis_conn, "user", "all", load_page))[1] == b"page"
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from conftest import create_loan, login
+from test_payments import payment
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_requests_share_the_async_engine(api, client):
+    dependency = api.get_async_db()
+    assert isinstance(await dependency.__anext__(), AsyncSession)
+    await dependency.aclose()
+
+    headers = await login(client, "async@buffr.ai")
+    loan_ids = await asyncio.gather(*(create_loan(client, headers, "async@buffr.ai", amount=1000) for _ in range(5)))
+    responses = await asyncio.gather(*(
+        client.post("/api/payments", headers=headers, json=payment(loan_id, 100)) for loan_id in loan_ids
+    ))
+    assert [response.status_code for response in responses] == [200] * 5
+
+    response = await client.get("/api/loans", headers=headers)
+    assert response.status_code == 200, response.text
+    loans = {loan["id"]: loan for loan in response.json()["data"]}
+    assert set(loans) == set(loan_ids)
+    assert {loan["remaining_balance"] for loan in loans.values()} == {900}
+
+
+def application(application_id: str, amount: float = 2000, **fields) -> dict:
+    return {"application_id": application_id, "user_id": "bulk@buffr.ai", "company_id": "bulk-company",
+            "employee_verification_id": "bulk-verification", "loan_amount": amount, "loan_term": 6,
+            "monthly_income": 20000, **fields}
+
+
+async def test_bulk_intake_creates_valid_rows_and_reports_the_rest(api, client):
+    headers = await login(client, "bulk@buffr.ai")
+    existing = f"BULK-{os.urandom(8).hex()}"
+    response = await client.post("/api/loans", headers=headers, json=application(existing))
+    assert response.status_code == 200, response.text
+
+    fresh = [f"BULK-{os.urandom(8).hex()}" for _ in range(2)]
+    rows = [application(fresh[0]), application(fresh[1], amount=3000), application(fresh[0]),
+            application(existing), application(f"BULK-{os.urandom(8).hex()}", amount=0)]
+    response = await client.post("/api/loans/bulk", headers=headers, json={"applications": rows})
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert (data["created"], data["rejected"]) == (2, 3)
+    assert [(row["index"], row["status"], row["error"]) for row in data["results"]] == [
+        (0, "created", None),
+        (1, "created", None),
+        (2, "rejected", "duplicate application_id in batch"),
+        (3, "rejected", "application_id already exists"),
+        (4, "rejected", "loan_amount must be positive"),
+    ]
+
+    loan_ids = [row["loan_id"] for row in data["results"][:2]]
+    async with api.AsyncSessionLocal() as db:
+        result = await db.execute(select(api.Loan).where(api.Loan.id.in_(loan_ids)))
+        loans = {loan.id: loan for loan in result.scalars()}
+        ledger = dict((await db.execute(
+            select(api.LedgerEntry.loan_id, func.sum(api.LedgerEntry.amount))
+            .where(api.LedgerEntry.loan_id.in_(loan_ids)).group_by(api.LedgerEntry.loan_id)
+        )).all())
+        events = await db.scalar(select(func.count()).select_from(api.OutboxEvent).where(
+            api.OutboxEvent.event_type == "loan.created", api.OutboxEvent.aggregate_id.in_(loan_ids)
+        ))
+    assert sorted(loan.amount for loan in loans.values()) == [2000, 3000]
+    assert ledger == {loan_id: pytest.approx(loans[loan_id].remaining_balance) for loan_id in loan_ids}
+    assert events == 2
+
+    response = await client.get("/api/loans", headers=headers)
+    assert set(loan_ids) <= {loan["id"] for loan in response.json()["data"]}
+
+
+async def test_keyset_pages_stay_stable_while_loans_are_added(api, client):
+    headers = await login(client, "pages@buffr.ai")
+    created = [await create_loan(client, headers, "pages@buffr.ai", amount=1000) for _ in range(5)]
+
+    seen, params = [], {"limit": 2}
+    while True:
+        response = await client.get("/api/loans", headers=headers, params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        seen += [loan["id"] for loan in body["data"]]
+        if body["pagination"]["next_cursor"] is None:
+            break
+        params["cursor"] = body["pagination"]["next_cursor"]
+        if len(seen) == 2:
+            # A loan created mid-walk sorts before the cursor, so it neither shifts nor repeats later pages
+            await create_loan(client, headers, "pages@buffr.ai", amount=1000)
+    assert seen == created[::-1]
+
+    # The stream walks the same keyset order, from the newest loan down
+    response = await client.get("/api/loans", headers=headers, params={"stream": "true"})
+    streamed = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert len(streamed) == 6 and streamed[1:] == created[::-1]
+
+    response = await client.get("/api/loans", headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_orjson_response_renders_datetimes_and_non_string_keys(api):
+    response = api.ORJSONResponse({"at": datetime(2026, 10, 17, 9, 30), 3: [1.5, None]})
+    assert response.body == b'{"at":"2026-10-17T09:30:00","3":[1.5,null]}'
+    assert response.media_type == "application/json"
+
+
+async def test_loan_responses_carry_exactly_the_declared_fields(api, client):
+    headers = await login(client, "typed@buffr.ai")
+    body = application(f"TYPED-{os.urandom(8).hex()}", user_id="typed@buffr.ai")
+    retryable = {**headers, "Idempotency-Key": body["application_id"]}
+    response = await client.post("/api/loans", headers=retryable, json=body)
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert set(data["loan"]) == set(api.LoanResponse.model_fields)
+    assert set(data["application"]) == set(api.LoanApplicationResponse.model_fields)
+    assert datetime.fromisoformat(data["loan"]["created_at"])
+
+    # A retried request replays the stored body byte for byte
+    replay = await client.post("/api/loans", headers=retryable, json=body)
+    assert replay.content == response.content
+
+    response = await client.get("/api/loans", headers=headers)
+    assert [set(loan) for loan in response.json()["data"]] == [set(api.LoanResponse.model_fields)]
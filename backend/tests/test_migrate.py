@@ -0,0 +1,59 @@
+import importlib
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, insert, text
+
+import migrate
+
+EXPECTED_INDEXES = {
+    "loan_applications": {"ix_loan_applications_company_id"},
+    "loans": {"ix_loans_user_id_status", "ix_loans_user_id_created_at_id"},
+    "payments": {"ix_payments_loan_id_payment_date", "ix_payments_reference_number"},
+    "ledger_entries": {"ix_ledger_entries_loan_id_sequence"},
+    "outbox_events": {"ix_outbox_events_unpublished"},
+}
+
+
+def tables_without_indexes(engine):
+    """A database created before its tables gained their indexes"""
+    baseline = importlib.import_module("migrations.0001_baseline")
+    with engine.begin() as connection:
+        baseline.metadata.create_all(connection)
+        for table in EXPECTED_INDEXES:
+            for index in inspect(connection).get_indexes(table):
+                connection.execute(text(f"DROP INDEX {index['name']}"))
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_adds_indexes_to_tables_that_predate_migrations(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.sqlite'}")
+    tables_without_indexes(engine)
+
+    migrate.upgrade(engine)
+
+    for table, expected in EXPECTED_INDEXES.items():
+        assert expected <= index_names(engine, table), table
+
+
+def test_upgrade_repairs_databases_that_recorded_the_baseline_without_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recorded.sqlite'}")
+    tables_without_indexes(engine)
+    with engine.begin() as connection:
+        migrate.schema_migrations.create(connection)
+        connection.execute(insert(migrate.schema_migrations), [
+            {"version": "0001", "name": "baseline", "applied_at": datetime.utcnow()},
+            {"version": "0002", "name": "partition_payments", "applied_at": datetime.utcnow()},
+        ])
+
+    assert migrate.upgrade(engine)[0] == "0003"
+    for table, expected in EXPECTED_INDEXES.items():
+        assert expected <= index_names(engine, table), table
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.sqlite'}")
+    assert migrate.upgrade(engine)[:6] == ["0001", "0002", "0003", "0004", "0005", "0006"]
+    assert migrate.upgrade(engine) == []
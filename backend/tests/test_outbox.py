@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from conftest import login
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_purge_deletes_only_events_published_before_the_retention_window(api):
+    import outbox
+
+    now = datetime.utcnow()
+    rows = {
+        "old-published": now - timedelta(days=30),
+        "recent-published": now - timedelta(days=1),
+        "unpublished": None,
+    }
+    async with api.AsyncSessionLocal() as db:
+        await db.execute(delete(api.OutboxEvent))
+        await db.execute(insert(api.OutboxEvent), [
+            {"id": event_id, "event_type": "test", "aggregate_id": event_id, "payload": {},
+             "created_at": now - timedelta(days=30), "available_at": now - timedelta(days=30),
+             "published_at": published_at}
+            for event_id, published_at in rows.items()
+        ])
+        await db.commit()
+
+    assert await outbox.purge_published(retention_days=7, batch_size=1) == 1
+
+    async with api.AsyncSessionLocal() as db:
+        remaining = set((await db.execute(select(api.OutboxEvent.id))).scalars())
+    assert remaining == {"recent-published", "unpublished"}
+    await api.database.dispose_engines()
+
+
+async def test_outbox_stats_endpoint(client):
+    headers = await login(client, "ops@buffr.ai")
+    response = await client.get("/api/outbox/stats", headers=headers)
+    assert response.status_code == 200, response.text
+    assert set(response.json()["data"]) == {"outbox", "stream", "workers"}
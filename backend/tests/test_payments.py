@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from conftest import create_loan, login
+
+pytestmark = pytest.mark.anyio
+
+
+def payment(loan_id: str, amount: float, **fields) -> dict:
+    return {"loan_id": loan_id, "user_id": "payer@buffr.ai", "amount": amount,
+            "payment_date": datetime.utcnow().isoformat(), **fields}
+
+
+async def loan_state(api, loan_id: str):
+    async with api.AsyncSessionLocal() as db:
+        loan = await db.get(api.Loan, loan_id)
+        ledger = await db.scalar(select(func.sum(api.LedgerEntry.amount)).where(api.LedgerEntry.loan_id == loan_id))
+        return loan, ledger
+
+
+async def test_payments_reduce_balance_and_ledger_together(api, client):
+    headers = await login(client, "payer@buffr.ai")
+    loan_id = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+    before, _ = await loan_state(api, loan_id)
+
+    for amount in (100, 250):
+        response = await client.post("/api/payments", headers=headers, json=payment(loan_id, amount))
+        assert response.status_code == 200, response.text
+
+    loan, ledger = await loan_state(api, loan_id)
+    assert loan.remaining_balance == pytest.approx(before.remaining_balance - 350)
+    assert loan.total_paid == pytest.approx(350)
+    assert ledger == pytest.approx(loan.remaining_balance)
+
+
+async def test_payment_on_missing_or_completed_loan(api, client):
+    headers = await login(client, "payer@buffr.ai")
+    loan_id = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+
+    response = await client.post("/api/payments", headers=headers, json=payment("no-such-loan", 10))
+    assert response.status_code == 404
+
+    response = await client.post("/api/payments", headers=headers, json=payment(loan_id, 10 ** 6))
+    assert response.status_code == 200, response.text
+    loan, ledger = await loan_state(api, loan_id)
+    assert (loan.status, loan.remaining_balance, ledger) == ("completed", 0, pytest.approx(0))
+
+    response = await client.post("/api/payments", headers=headers, json=payment(loan_id, 10))
+    assert response.status_code == 409
+
+
+async def test_ingest_applies_each_loans_total_once(api, client):
+    headers = await login(client, "payer@buffr.ai")
+    first = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+    second = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+    (before_first, _), (before_second, _) = await loan_state(api, first), await loan_state(api, second)
+
+    rows = [payment(first, 100, reference_number=f"ingest-{first}-1"),
+            payment(first, 50),
+            payment(second, 10 ** 6),
+            payment(first, 100, reference_number=f"ingest-{first}-1"),
+            payment("no-such-loan", 10)]
+    body = "\n".join(json.dumps(row) for row in rows)
+    response = await client.post("/api/payments/ingest", headers={**headers, "Content-Type": "application/x-ndjson"},
+                                 content=body)
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert (data["accepted"], data["rejected"], data["loans_updated"]) == (3, 2, 2)
+    assert sorted(row["error"] for row in data["rejected_rows"]) == ["duplicate reference_number", "loan not found"]
+
+    loan, ledger = await loan_state(api, first)
+    assert loan.remaining_balance == pytest.approx(before_first.remaining_balance - 150)
+    assert ledger == pytest.approx(loan.remaining_balance)
+    loan, ledger = await loan_state(api, second)
+    assert (loan.status, loan.remaining_balance, ledger) == ("completed", 0, pytest.approx(0))
+    assert loan.total_paid == pytest.approx((before_second.total_paid or 0) + 10 ** 6)
+
+    response = await client.post("/api/payments/ingest", headers={**headers, "Content-Type": "application/x-ndjson"},
+                                 content=json.dumps(payment(second, 10)))
+    assert response.json()["data"]["rejected_rows"][0]["error"] == "loan already completed"
+
+
+@pytest.mark.parametrize("amount", [-100, 0])
+async def test_non_positive_payment_is_rejected(api, client, amount):
+    headers = await login(client, "payer@buffr.ai")
+    loan_id = await create_loan(client, headers, "payer@buffr.ai", amount=1000)
+    before, _ = await loan_state(api, loan_id)
+
+    response = await client.post("/api/payments", headers=headers, json=payment(loan_id, amount))
+    assert response.status_code == 422
+
+    loan, _ = await loan_state(api, loan_id)
+    assert (loan.remaining_balance, loan.total_paid) == (before.remaining_balance, before.total_paid)
@@ -0,0 +1,64 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import pricing
+
+AMOUNTS = [500, 9999.99, 10000, 10000.01, 50000]
+INCOMES = [0, 4999.99, 5000, 10000, 15000, 15000.01, 80000]
+TERMS = [1, 6, 12, 36]
+
+
+@pytest.fixture
+def service(api):
+    return api.LoanService(None)
+
+
+def test_vectorized_pricing_matches_the_scalar_rules(service):
+    grid = list(itertools.product(AMOUNTS, INCOMES, TERMS))
+    amounts, incomes, terms = (np.array(column) for column in zip(*grid))
+
+    rates = pricing.interest_rates(amounts, incomes)
+    payments = pricing.monthly_payments(amounts, terms, rates)
+    totals = pricing.total_amounts(amounts, terms, rates)
+
+    for index, (amount, income, term) in enumerate(grid):
+        rate = service.calculate_interest_rate(amount, income)
+        assert rates[index] == pytest.approx(rate), (amount, income)
+        assert payments[index] == pytest.approx(service.calculate_monthly_payment(amount, term, rate))
+        assert totals[index] == pytest.approx(service.calculate_total_amount(amount, term, rate))
+
+
+def test_max_loan_amount_is_affordable_at_its_own_price(service):
+    incomes = np.array([3000, 8000, 14000, 20000, 60000, 200000], dtype=np.float64)
+    expenses = incomes * 0.4
+    amounts, rates = pricing.max_loan_amounts(incomes, expenses, 12)
+
+    for amount, rate, income, expense in zip(amounts, rates, incomes, expenses):
+        assert rate == pytest.approx(service.calculate_interest_rate(amount, income))
+        payment = service.calculate_monthly_payment(amount, 12, rate)
+        assert payment == pytest.approx((income - expense) * pricing.AFFORDABILITY_RATIO)
+
+
+def test_stress_totals_do_not_depend_on_chunking():
+    rng = np.random.default_rng(7)
+    size = 1000
+    amounts = rng.uniform(500, 50000, size)
+    terms = rng.integers(1, 37, size)
+    incomes = rng.uniform(1000, 40000, size)
+    expenses = incomes * rng.uniform(0.1, 0.6, size)
+    rates = pricing.interest_rates(amounts, incomes)
+
+    whole, chunked = (pricing.PortfolioStress("shock", rate_shift=0.5, income_shock=0.2) for _ in range(2))
+    whole.add_chunk(amounts, terms, rates, amounts, incomes, expenses)
+    for start in range(0, size, 128):
+        window = slice(start, start + 128)
+        chunked.add_chunk(amounts[window], terms[window], rates[window], amounts[window],
+                          incomes[window], expenses[window])
+
+    expected = whole.result()
+    assert chunked.result() == {name: pytest.approx(value) if isinstance(value, float) else value
+                                for name, value in expected.items()}
+    assert expected["unaffordable_loans_after"] >= expected["unaffordable_loans_before"]
+    assert expected["average_rate_after"] > expected["average_rate_before"]
@@ -0,0 +1,75 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, text
+
+import profiling
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def signer():
+    return profiling.profile_signer("profile:profile-signing-secret-at-least-32-characters")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return profiling.ProfileStore(str(tmp_path / "profiles"), keep=2)
+
+
+def query_app(engine):
+    """An ASGI app that runs one query per request"""
+    async def app(scope, receive, send):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+async def test_only_requests_with_a_valid_token_are_profiled(signer, store):
+    engine = create_engine("sqlite://")
+    profiling.instrument_engine(engine, "primary")
+    middleware = profiling.ProfilingMiddleware(query_app(engine), store=store, signer=signer)
+    token = signer.issue(profiling.PROFILE_SUBJECT, 60)["token"]
+    other = profiling.profile_signer("other:another-signing-secret-at-least-32-characters")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test") as http:
+        for headers in ({}, {"X-Profile-Token": "garbage"},
+                        {"X-Profile-Token": other.issue(profiling.PROFILE_SUBJECT, 60)["token"]}):
+            response = await http.get("/api/loans", headers=headers)
+            assert "x-profile-id" not in response.headers
+        assert store.list() == []
+
+        profile_ids = []
+        for _ in range(3):
+            response = await http.get("/api/loans", headers={"X-Profile-Token": token})
+            profile_ids.append(response.headers["x-profile-id"])
+
+    summary = json.loads(store.read(profile_ids[-1], ".json"))
+    assert (summary["method"], summary["path"], summary["trigger"], summary["status"]) == (
+        "GET", "/api/loans", "header", 200
+    )
+    assert summary["sql_count"] == 1 and summary["queries"][0]["statement"] == "SELECT 1"
+    assert summary["queries"][0]["engine"] == "primary"
+    # Only the newest PROFILE_KEEP are kept
+    assert [entry["id"] for entry in store.list()] == [profile_ids[2], profile_ids[1]]
+    assert store.read(profile_ids[0], ".json") is None
+
+
+async def test_admin_endpoints_need_a_profiling_token(api, client, signer, store, monkeypatch):
+    monkeypatch.setattr(api, "profile_signer", signer)
+    monkeypatch.setattr(api, "profile_store", store)
+    token = {"X-Profile-Token": signer.issue(profiling.PROFILE_SUBJECT, 60)["token"]}
+    middleware = profiling.ProfilingMiddleware(query_app(create_engine("sqlite://")), store=store, signer=signer)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test") as http:
+        profile_id = (await http.get("/api/loans", headers=token)).headers["x-profile-id"]
+
+    assert (await client.get("/api/admin/profiles")).status_code == 404
+    response = await client.get("/api/admin/profiles", headers=token)
+    assert [entry["id"] for entry in response.json()["data"]] == [profile_id]
+    response = await client.get(f"/api/admin/profiles/{profile_id}", headers=token, params={"format": "pstats"})
+    assert response.status_code == 200 and response.content == store.read(profile_id, ".prof")
+    assert (await client.get("/api/admin/profiles/..%2Fsecrets", headers=token)).status_code == 404
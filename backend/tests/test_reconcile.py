@@ -0,0 +1,80 @@
+import os
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from conftest import login
+from test_payments import payment
+
+pytestmark = pytest.mark.anyio
+
+COMPANY = "aggregate-company"
+
+
+def application(amount: float, term: int = 6) -> dict:
+    return {"application_id": f"AGG-{os.urandom(8).hex()}", "user_id": "aggregate@buffr.ai", "company_id": COMPANY,
+            "employee_verification_id": "aggregate-verification", "loan_amount": amount, "loan_term": term,
+            "monthly_income": 20000}
+
+
+async def stored_totals(client, headers) -> dict:
+    response = await client.get("/api/portfolio/companies", headers=headers, params={"company_id": COMPANY})
+    assert response.status_code == 200, response.text
+    row, = response.json()["data"]
+    return {name: row[name] for name in ("loan_count", "total_disbursed", "total_paid", "outstanding_balance",
+                                         "delinquent_count")}
+
+
+async def test_incremental_aggregates_match_a_full_reconciliation(api, client):
+    import accrual
+    import ledger
+    import reconcile
+
+    headers = await login(client, "aggregate@buffr.ai")
+    response = await client.post("/api/loans", headers=headers, json=application(1000))
+    single = response.json()["data"]["loan"]["id"]
+    response = await client.post("/api/loans/bulk", headers=headers,
+                                 json={"applications": [application(2000), application(3000)]})
+    bulk = [row["loan_id"] for row in response.json()["data"]["results"]]
+
+    # A payment, a payoff through ingest, an overdue loan and a manual credit all move the totals
+    assert (await client.post("/api/payments", headers=headers, json=payment(single, 250))).status_code == 200
+    response = await client.post("/api/payments/ingest", headers={**headers, "Content-Type": "application/x-ndjson"},
+                                 content=f'{{"loan_id": "{bulk[0]}", "amount": 5000, "payment_date": "2026-10-01"}}')
+    assert response.status_code == 200, response.text
+    assert (await client.post(f"/api/loans/{bulk[1]}/disburse", headers=headers)).status_code == 200
+    async with api.AsyncSessionLocal() as db:
+        disbursed = await db.get(api.Loan, bulk[1])
+    accrual.run(disbursed.disbursement_date.date() + timedelta(days=95))
+    ledger.adjust(single, -50, memo="goodwill credit")
+
+    stored = await stored_totals(client, headers)
+    async with api.AsyncSessionLocal() as db:
+        overdue = await db.get(api.Loan, bulk[1])
+    assert overdue.status == "overdue"
+    assert stored == {
+        "loan_count": 3,
+        "total_disbursed": 6000,
+        "total_paid": 5250,
+        "outstanding_balance": pytest.approx(1000 - 250 - 50 + overdue.remaining_balance),
+        "delinquent_count": 1,
+    }
+    assert COMPANY not in reconcile.reconcile()["corrections"]
+
+
+async def test_reconciliation_corrects_drift(api, client):
+    import reconcile
+
+    headers = await login(client, "aggregate@buffr.ai")
+    await client.post("/api/loans", headers=headers, json=application(1500))
+    expected = await stored_totals(client, headers)
+
+    async with api.AsyncSessionLocal() as db:
+        await db.execute(update(api.CompanyPortfolio).where(api.CompanyPortfolio.company_id == COMPANY)
+                         .values(loan_count=0, outstanding_balance=-1))
+        await db.commit()
+
+    corrections = reconcile.reconcile()["corrections"]
+    assert corrections[COMPANY]["loan_count"] == expected["loan_count"]
+    assert await stored_totals(client, headers) == pytest.approx(expected)
@@ -0,0 +1,94 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from conftest import create_loan, login
+from replicas import ReadRouter
+
+pytestmark = pytest.mark.anyio
+
+
+class Recorder:
+    """Stands in for a sessionmaker, noting which target each session came from"""
+
+    def __init__(self, target: str, calls: list, factory=None):
+        self.target = target
+        self.calls = calls
+        self.factory = factory
+
+    def __call__(self):
+        self.calls.append(self.target)
+        return self.factory() if self.factory else self.target
+
+
+class BrokenRedis:
+    async def exists(self, *keys):
+        raise ConnectionError("redis down")
+
+
+def router(calls: list, sticky_seconds: float = 5.0, factory=None) -> ReadRouter:
+    replicas = [Recorder("replica0", calls, factory), Recorder("replica1", calls, factory)]
+    return ReadRouter(Recorder("primary", calls, factory), Recorder("primary", calls),
+                      replicas, [Recorder("replica0", calls), Recorder("replica1", calls)], sticky_seconds)
+
+
+async def test_reads_round_robin_until_the_user_writes():
+    calls = []
+    redis_conn = fakeredis.FakeAsyncRedis()
+    reads = router(calls)
+
+    for _ in range(3):
+        await reads.session(redis_conn, "writer")
+    await reads.pin(redis_conn, "writer")
+    await reads.session(redis_conn, "writer")
+    await reads.session(redis_conn, "someone-else")
+    await reads.session()
+
+    assert calls == ["replica0", "replica1", "replica0", "primary", "replica1", "replica0"]
+
+
+async def test_pin_holds_on_other_workers_and_expires():
+    calls = []
+    redis_conn = fakeredis.FakeAsyncRedis()
+    await router([], sticky_seconds=0.1).pin(redis_conn, "writer")
+    other_worker = router(calls, sticky_seconds=0.1)
+
+    await other_worker.session(redis_conn, "writer")
+    await asyncio.sleep(0.2)
+    await other_worker.session(redis_conn, "writer")
+
+    assert calls == ["primary", "replica0"]
+
+
+async def test_unreadable_pin_reads_from_the_primary():
+    calls = []
+    await router(calls).session(BrokenRedis(), "writer")
+    assert calls == ["primary"]
+
+
+async def test_without_replicas_nothing_touches_redis():
+    calls = []
+    reads = ReadRouter(Recorder("primary", calls), Recorder("primary", calls), [], [])
+    await reads.pin(BrokenRedis(), "writer")
+    await reads.session(BrokenRedis(), "writer")
+    reads.sync_session()
+    assert calls == ["primary", "primary"]
+
+
+async def test_listing_after_a_write_reads_from_the_primary(api, client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "read_router", router(calls, sticky_seconds=0.2, factory=api.AsyncSessionLocal))
+    headers = await login(client, "sticky@buffr.ai")
+
+    await create_loan(client, headers, "sticky@buffr.ai", amount=1000)
+    calls.clear()
+    response = await client.get("/api/loans", headers=headers)
+    assert response.status_code == 200 and len(response.json()["data"]) == 1
+    assert calls == ["primary"]
+
+    # Another page size misses the listing cache, so it opens a session too
+    await asyncio.sleep(0.3)
+    response = await client.get("/api/loans", headers=headers, params={"limit": 5})
+    assert response.status_code == 200
+    assert calls == ["primary", "replica0"]
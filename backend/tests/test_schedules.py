@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+import schedules
+from conftest import create_loan, login
+from schedules import ScheduleCache, add_months, build_schedule
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("amount, term_months, interest_rate", [
+    (1000, 1, 2.5), (1000, 3, 2.5), (9999.99, 7, 3.0), (10000.01, 12, 1.5), (123456.78, 60, 4.75),
+])
+def test_schedule_sums_to_the_loan_exactly(amount, term_months, interest_rate):
+    schedule = build_schedule(amount, term_months, interest_rate)
+
+    assert len(schedule) == term_months
+    assert round(sum(schedule.principal), 2) == amount
+    assert round(sum(schedule.interest), 2) == round(amount * interest_rate / 100 * term_months, 2)
+    assert list(schedule.balance) == sorted(schedule.balance, reverse=True)
+    assert schedule.balance[-1] == 0
+    # Every period but the last is the same instalment
+    assert len(set(schedule.principal[:-1])) <= 1 and len(set(schedule.interest[:-1])) <= 1
+
+
+def test_due_dates_clamp_to_the_end_of_shorter_months():
+    start = datetime(2027, 1, 31, 9, 0)
+    assert [add_months(start, months).date().isoformat() for months in (1, 2, 13)] == [
+        "2027-02-28", "2027-03-31", "2028-02-29",
+    ]
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(schedules.time, "monotonic", lambda: now)
+    cache = ScheduleCache(ttl=60)
+
+    first = cache.get(1000, 12, 2.5)
+    now += 59
+    assert cache.get(1000.001, 12, 2.5000001) is first
+    now += 2
+    assert cache.get(1000, 12, 2.5) is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ScheduleCache(maxsize=2)
+    first, second = cache.get(1000, 12, 2.5), cache.get(2000, 12, 2.5)
+    assert cache.get(1000, 12, 2.5) is first
+    cache.get(3000, 12, 2.5)
+
+    assert cache.get(1000, 12, 2.5) is first
+    assert cache.get(2000, 12, 2.5) is not second
+    assert cache.stats()["entries"] == 2
+
+
+async def test_schedule_endpoint_repays_the_total_amount(api, client):
+    headers = await login(client, "schedule@buffr.ai")
+    loan_id = await create_loan(client, headers, "schedule@buffr.ai", amount=7777.77, term=9)
+    async with api.AsyncSessionLocal() as db:
+        loan = await db.get(api.Loan, loan_id)
+
+    response = await client.get(f"/api/loans/{loan_id}/schedule", headers=headers)
+    assert response.status_code == 200, response.text
+    periods = response.json()["data"]["periods"]
+    assert len(periods) == 9
+    assert sum(period["payment"] for period in periods) == pytest.approx(loan.total_amount, abs=0.01)
+    assert datetime.fromisoformat(periods[0]["due_date"]) == add_months(loan.created_at, 1)
+
+    response = await client.get("/api/loans/no-such-loan/schedule", headers=headers)
+    assert response.status_code == 404
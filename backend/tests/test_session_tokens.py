@@ -0,0 +1,19 @@
+import pytest
+
+from session_tokens import parse_signing_keys
+
+
+def test_configured_keys_are_ordered_with_the_first_signing():
+    keys = parse_signing_keys("new:secret-two, old:secret-one", "fallback")
+    assert list(keys) == ["new", "old"]
+    assert keys["new"] == b"secret-two"
+
+
+def test_fallback_secret_is_used_when_no_keys_are_configured():
+    assert parse_signing_keys("", "jwt-secret") == {"default": b"jwt-secret"}
+
+
+@pytest.mark.parametrize("value", [None, "", "no-secret:"])
+def test_missing_signing_key_fails_instead_of_generating_one(value):
+    with pytest.raises(ValueError, match="SESSION_SIGNING_KEYS"):
+        parse_signing_keys(value, None)